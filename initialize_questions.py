@@ -5,14 +5,43 @@ Initialize Question Data for Data Annotation Website
 This script creates sample question data files for the Material Science
 and Chemistry domains. Run this script to set up the initial data for
 the Python backend.
+
+It can also import real corpora into the per-domain files the Flask API
+serves. Input files are stream-parsed, so a corpus is never held in memory
+as a whole. Two shapes are understood:
+  - a top-level list of {"qid", "question", "answer1", "answer2", ...,
+    "labels"} records (knowledgedistillation-combined*.json)
+  - {"questions": [{"id", "text", "qid", "answers": [...]}, ...]}
+    (response-preference-questions*.json)
+
+Records are normalized to the API's question schema and deduplicated by
+qid, with the first occurrence winning. Each question is written on its
+own line, and a byte-offset index (<domain>-questions.idx.json) is written
+next to the file so the server can seek to a single question.
+
+Usage:
+    python initialize_questions.py
+    python initialize_questions.py import --domain "Response Preference" \
+        public/data/response-preference-questions.json
 """
 
 import os
+import re
+import sys
 import json
+import argparse
 
 # Create data directory
 DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
-os.makedirs(DATA_DIR, exist_ok=True)
+
+# Directory the Flask API reads domain question files from
+API_DATA_DIR = os.path.join(os.path.dirname(__file__), 'public', 'data')
+
+# Bytes read from an input corpus at a time while stream-parsing
+READ_SIZE = 64 * 1024
+
+# Fields carried over from source records into normalized questions
+EXTRA_FIELDS = ['qid', 'question_type', 'reference_answer', 'polymer_details']
 
 # Sample Chemistry questions
 chemistry_questions = {
@@ -134,11 +163,213 @@ material_science_questions = {
     ]
 }
 
-# Write to JSON files
-with open(os.path.join(DATA_DIR, 'chemistry-questions.json'), 'w') as f:
-    json.dump(chemistry_questions, f, indent=2)
 
-with open(os.path.join(DATA_DIR, 'material-science-questions.json'), 'w') as f:
-    json.dump(material_science_questions, f, indent=2)
+def write_sample_questions():
+    """Write the sample Chemistry and Material Science question files."""
+    os.makedirs(DATA_DIR, exist_ok=True)
+
+    with open(os.path.join(DATA_DIR, 'chemistry-questions.json'), 'w') as f:
+        json.dump(chemistry_questions, f, indent=2)
+
+    with open(os.path.join(DATA_DIR, 'material-science-questions.json'), 'w') as f:
+        json.dump(material_science_questions, f, indent=2)
+
+    print("Question data files have been created in the 'data' directory.")
+
+
+class _StreamReader:
+    """Incremental JSON reader over a text file, decoding one value at a time."""
+
+    def __init__(self, f):
+        self.f = f
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        chunk = self.f.read(READ_SIZE)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Return the next non-whitespace character without consuming it."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r} at offset {self.pos}, found {self.peek()!r}")
+        self.pos += 1
+
+    def value(self):
+        """Decode the next complete JSON value."""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # A number ending exactly at the buffer edge may continue
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            if not self._fill():
+                value, self.pos = self.decoder.raw_decode(self.buffer, self.pos)
+                return value
+
+    def array_items(self):
+        """Yield the items of the JSON array starting at the current position."""
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.peek() == ',':
+                self.pos += 1
+                continue
+            self.expect(']')
+            return
+
+
+def iter_corpus(path):
+    """Yield raw question records from a corpus file without loading it whole."""
+    with open(path, 'r', encoding='utf-8') as f:
+        reader = _StreamReader(f)
+        if reader.peek() == '[':
+            yield from reader.array_items()
+            return
+
+        reader.expect('{')
+        while reader.peek() != '}':
+            key = reader.value()
+            reader.expect(':')
+            if key == 'questions':
+                yield from reader.array_items()
+            else:
+                reader.value()
+            if reader.peek() == ',':
+                reader.pos += 1
+        reader.expect('}')
+
+
+def _parse_labels(labels):
+    """Parse "1: PolyData, 2: GPT 4o" into {1: 'PolyData', 2: 'GPT 4o'}."""
+    return {int(n): name.strip()
+            for n, name in re.findall(r'(\d+):\s*(.*?)(?=,\s*\d+:|$)', labels or '')}
+
+
+def normalize_question(record, id_prefix='kd_'):
+    """Convert a raw corpus record into the question schema served by the API."""
+    if 'answers' in record:
+        question = {
+            'id': record.get('id') or f"{id_prefix}{record['qid']}",
+            'text': record.get('text', record.get('question', '')),
+            'answers': [dict(a) for a in record['answers']]
+        }
+    else:
+        question_id = record.get('id') or f"{id_prefix}{record['qid']}"
+        labels = _parse_labels(record.get('labels'))
+        numbers = sorted(int(k[len('answer'):]) for k in record
+                         if k.startswith('answer') and k[len('answer'):].isdigit())
+        answers = []
+        for n in numbers:
+            answer = {'id': f"{question_id}-a{n}", 'text': record[f'answer{n}']}
+            if n in labels:
+                answer['label'] = labels[n]
+            answers.append(answer)
+        question = {
+            'id': question_id,
+            'text': record.get('question', record.get('text', '')),
+            'answers': answers
+        }
+
+    for field in EXTRA_FIELDS:
+        if field in record:
+            question[field] = record[field]
+    return question
+
+
+def import_corpora(domain, paths, out_dir=API_DATA_DIR, id_prefix='kd_'):
+    """Import corpus files into one domain file plus its byte-offset index."""
+    os.makedirs(out_dir, exist_ok=True)
+    key = domain.lower().replace(' ', '-')
+    out_path = os.path.join(out_dir, f"{key}-questions.json")
+    index_path = os.path.join(out_dir, f"{key}-questions.idx.json")
+    tmp_path = out_path + '.tmp'
+
+    seen = set()
+    ids = []
+    offsets = []
+    skipped = 0
+    unidentified = 0
+    with open(tmp_path, 'wb') as out:
+        out.write(b'{"questions": [\n')
+        for path in paths:
+            for record in iter_corpus(path):
+                if not record.get('id') and record.get('qid') is None:
+                    unidentified += 1
+                    continue
+                # Dedupe on the id the question is served under, which is unique across corpora
+                question = normalize_question(record, id_prefix)
+                if question['id'] in seen:
+                    skipped += 1
+                    continue
+                seen.add(question['id'])
+
+                data = json.dumps(question, ensure_ascii=False).encode('utf-8')
+                if ids:
+                    out.write(b',\n')
+                offsets.append([out.tell(), len(data)])
+                ids.append(question['id'])
+                out.write(data)
+        out.write(b'\n]}\n')
+
+    os.replace(tmp_path, out_path)
+    st = os.stat(out_path)
+    with open(index_path + '.tmp', 'w') as f:
+        json.dump({
+            'file_mtime_ns': st.st_mtime_ns,
+            'file_size': st.st_size,
+            'ids': ids,
+            'offsets': offsets
+        }, f)
+    os.replace(index_path + '.tmp', index_path)
+
+    print(f"Imported {len(ids)} questions into {out_path} ({skipped} duplicates skipped)")
+    if unidentified:
+        print(f"Skipped {unidentified} records without an id or qid")
+    return len(ids)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Create or import question data files.')
+    subparsers = parser.add_subparsers(dest='command')
+    importer = subparsers.add_parser('import', help='import corpus files into a domain')
+    importer.add_argument('paths', nargs='+', help='corpus files, earlier files win on duplicate qids')
+    importer.add_argument('--domain', required=True, help='domain name served by /api/question')
+    importer.add_argument('--out', default=API_DATA_DIR, help='output data directory')
+    importer.add_argument('--id-prefix', default='kd_',
+                          help='prefix for ids built from qid when a record has no id')
+    args = parser.parse_args(argv)
+
+    if args.command == 'import':
+        import_corpora(args.domain, args.paths, args.out, args.id_prefix)
+    else:
+        write_sample_questions()
+    return 0
+
 
-print("Question data files have been created in the 'data' directory.")
\ No newline at end of file
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Near-duplicate Detection for Data Annotation Website
+
+The corpora in public/data overlap: the same or nearly the same question,
+with the same or nearly the same answers, appears in several revisions.
+This script finds those near-duplicates across every corpus and writes a
+cluster map the Flask API loads, so the question sampler treats a cluster
+as one item when deciding what a user has already reviewed.
+
+Each question is one document made of its text and all answer texts,
+shingled into overlapping word n-grams. Documents are compared by MinHash
+signatures, computed in batches with NumPy, and candidate pairs come from
+locality-sensitive hashing over signature bands. Candidates are grouped
+with the first document in their band bucket, kept only when their
+estimated Jaccard similarity reaches the threshold, and clustered with
+connected components. Nothing is ever compared all-pairs, so the cost grows
+roughly linearly with the number of documents.
+
+Input files are read with the importer's stream parser (see
+initialize_questions.py). By default every domain file the API serves
+(<domain>-questions.json in public/data) is compared, and its domain is
+taken from the file name. Raw corpora must be given as DOMAIN=PATH, naming
+the domain they are served as; question ids are the ones the importer
+would assign.
+
+Usage:
+    python near_duplicates.py
+    python near_duplicates.py --threshold 0.9 "Response Preference=public/data/response-preference-questions.json" ...
+
+Requires NumPy.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import zlib
+import argparse
+
+import numpy as np
+
+from initialize_questions import API_DATA_DIR, iter_corpus, normalize_question
+
+# Default location of the cluster map read by the Flask API
+CLUSTERS_FILE = os.path.join(API_DATA_DIR, 'duplicate-clusters.json')
+
+# Suffix of the domain question files served by the API
+DOMAIN_SUFFIX = '-questions.json'
+
+# Prime modulus of the MinHash permutations; hash values fit in uint32
+MERSENNE_PRIME = (1 << 31) - 1
+
+# Shingle hashes per MinHash batch; bounds the (shingles, permutations) work array
+BATCH_SHINGLES = 1 << 16
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+def question_document(question):
+    """Return the text a question is compared by: its own text plus every answer."""
+    parts = [question.get('text', '')]
+    parts.extend(a.get('text', '') for a in question.get('answers', []))
+    return '\n'.join(parts)
+
+
+def shingle_hashes(text, size=3):
+    """Hash the overlapping `size`-word shingles of a text into uint64 values."""
+    tokens = TOKEN_RE.findall(text.lower())
+    if not tokens:
+        return np.zeros(0, dtype=np.uint64)
+    hashes = np.array([zlib.crc32(t.encode('utf-8')) for t in tokens], dtype=np.uint64)
+    if len(hashes) < size:
+        size = len(hashes)
+    count = len(hashes) - size + 1
+    shingles = np.zeros(count, dtype=np.uint64)
+    # Polynomial combination of token hashes; uint64 arithmetic wraps on purpose
+    with np.errstate(over='ignore'):
+        for offset in range(size):
+            shingles = shingles * np.uint64(1000003) + hashes[offset:offset + count]
+    return shingles % np.uint64(MERSENNE_PRIME)
+
+
+class MinHasher:
+    """MinHash signatures under `num_perm` random universal hash permutations."""
+
+    def __init__(self, num_perm=128, seed=1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.a = rng.integers(1, MERSENNE_PRIME, num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, MERSENNE_PRIME, num_perm, dtype=np.uint64)
+
+    def signatures(self, shingle_sets):
+        """Return a (documents, num_perm) uint32 array for non-empty shingle arrays."""
+        lengths = np.array([len(s) for s in shingle_sets])
+        starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        values = np.concatenate(shingle_sets)
+        # a, b and x are below 2**31, so a * x + b cannot overflow uint64
+        permuted = (values[:, None] * self.a + self.b) % np.uint64(MERSENNE_PRIME)
+        return np.minimum.reduceat(permuted, starts, axis=0).astype(np.uint32)
+
+
+def choose_bands(num_perm, threshold):
+    """Pick the fewest bands whose LSH threshold (1/b)**(1/r) is at most `threshold`.
+
+    Erring low favors recall; candidates below `threshold` are dropped when
+    their signatures are compared.
+    """
+    divisors = [b for b in range(1, num_perm + 1) if num_perm % b == 0]
+    return next((b for b in divisors if (1 / b) ** (b / num_perm) <= threshold), num_perm)
+
+
+def candidate_edges(signatures, bands, threshold):
+    """Return (document, bucket representative) pairs above `threshold` similarity."""
+    n, num_perm = signatures.shape
+    rows = num_perm // bands
+    edges = []
+    for band in range(bands):
+        block = np.ascontiguousarray(signatures[:, band * rows:(band + 1) * rows])
+        keys = block.view(np.dtype((np.void, block.dtype.itemsize * rows))).ravel()
+        _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        representative = first[inverse.ravel()]
+        documents = np.nonzero(representative != np.arange(n))[0]
+        if not len(documents):
+            continue
+        similarity = (signatures[documents] == signatures[representative[documents]]).mean(axis=1)
+        keep = similarity >= threshold
+        edges.append(np.stack([documents[keep], representative[documents][keep]], axis=1))
+    if not edges:
+        return np.zeros((0, 2), dtype=np.int64)
+    return np.unique(np.concatenate(edges), axis=0)
+
+
+def connected_components(n, edges):
+    """Label each of `n` nodes with the smallest node index in its component."""
+    labels = np.arange(n)
+    if not len(edges):
+        return labels
+    while True:
+        low = np.minimum(labels[edges[:, 0]], labels[edges[:, 1]])
+        hooked = labels.copy()
+        np.minimum.at(hooked, labels[edges[:, 0]], low)
+        np.minimum.at(hooked, labels[edges[:, 1]], low)
+        # Pointer jumping until every node points at its root
+        while True:
+            jumped = hooked[hooked]
+            if np.array_equal(jumped, hooked):
+                break
+            hooked = jumped
+        if np.array_equal(hooked, labels):
+            return labels
+        labels = hooked
+
+
+def default_inputs(data_dir=API_DATA_DIR):
+    """Return every domain question file the API serves from its data directory."""
+    return [os.path.join(data_dir, n) for n in sorted(os.listdir(data_dir))
+            if n.endswith(DOMAIN_SUFFIX)]
+
+
+def parse_input(spec):
+    """Split DOMAIN=PATH; a bare PATH must be a served <domain>-questions.json file."""
+    if '=' in spec and not os.path.exists(spec):
+        domain, path = spec.split('=', 1)
+        return domain, path
+    name = os.path.basename(spec)
+    if not name.endswith(DOMAIN_SUFFIX):
+        raise ValueError(f"{spec} is not a domain question file; pass it as DOMAIN=PATH")
+    return name[:-len(DOMAIN_SUFFIX)], spec
+
+
+def find_duplicates(inputs, threshold=0.8, num_perm=128, bands=None, shingle_size=3, seed=1):
+    """Cluster near-duplicate questions across (domain, path) inputs.
+
+    Returns (documents, clusters) where clusters lists member indices into
+    documents, each cluster ordered by input order.
+    """
+    hasher = MinHasher(num_perm, seed)
+    bands = bands or choose_bands(num_perm, threshold)
+    documents = []
+    batches = []
+    pending, pending_shingles = [], 0
+
+    def flush():
+        if pending:
+            batches.append(hasher.signatures(pending))
+            pending.clear()
+
+    for domain, path in inputs:
+        seen = set()
+        for record in iter_corpus(path):
+            question = normalize_question(record)
+            if question['id'] in seen:
+                continue
+            seen.add(question['id'])
+            shingles = shingle_hashes(question_document(question), shingle_size)
+            # Questions without any words have nothing to compare
+            if not len(shingles):
+                continue
+            documents.append({'domain': domain, 'id': question['id'], 'source': os.path.basename(path)})
+            pending.append(shingles)
+            pending_shingles += len(shingles)
+            if pending_shingles >= BATCH_SHINGLES:
+                flush()
+                pending_shingles = 0
+    flush()
+
+    if not documents:
+        return documents, []
+    signatures = np.concatenate(batches)
+    labels = connected_components(len(documents), candidate_edges(signatures, bands, threshold))
+    roots, inverse, sizes = np.unique(labels, return_inverse=True, return_counts=True)
+    order = np.argsort(inverse, kind='stable')
+    members = np.split(order, np.cumsum(sizes)[:-1])
+    clusters = [m.tolist() for m in members if len(m) > 1]
+    return documents, clusters
+
+
+def write_cluster_map(path, documents, clusters, params):
+    """Write clusters as lists of {domain, id, source} members."""
+    data = {
+        'params': params,
+        'documents': len(documents),
+        'clusters': [{'id': f'dup-{i}', 'members': [documents[m] for m in members]}
+                     for i, members in enumerate(clusters)]
+    }
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Find near-duplicate questions across corpora.')
+    parser.add_argument('inputs', nargs='*',
+                        help='domain question files, or corpora as DOMAIN=PATH '
+                             '(default: every served domain file in public/data)')
+    parser.add_argument('--out', default=CLUSTERS_FILE, help='cluster map to write')
+    parser.add_argument('--threshold', type=float, default=0.8, help='estimated Jaccard similarity to cluster at')
+    parser.add_argument('--num-perm', type=int, default=128, help='MinHash permutations per signature')
+    parser.add_argument('--bands', type=int, help='LSH bands (default: derived from the threshold)')
+    parser.add_argument('--shingle', type=int, default=3, help='words per shingle')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    if args.bands and args.num_perm % args.bands:
+        parser.error('--bands must divide --num-perm')
+    try:
+        inputs = [parse_input(spec) for spec in (args.inputs or default_inputs())]
+    except ValueError as e:
+        parser.error(str(e))
+    if not inputs:
+        parser.error(f'no domain question files in {API_DATA_DIR}; pass corpora as DOMAIN=PATH')
+    params = {
+        'threshold': args.threshold,
+        'num_perm': args.num_perm,
+        'bands': args.bands or choose_bands(args.num_perm, args.threshold),
+        'shingle': args.shingle,
+        'seed': args.seed
+    }
+
+    started = time.perf_counter()
+    documents, clusters = find_duplicates(inputs, args.threshold, args.num_perm, params['bands'],
+                                          args.shingle, args.seed)
+    write_cluster_map(args.out, documents, clusters, params)
+    duplicates = sum(len(c) - 1 for c in clusters)
+    print(f"Compared {len(documents)} questions from {len(inputs)} files in "
+          f"{time.perf_counter() - started:.2f}s: {len(clusters)} clusters, "
+          f"{duplicates} near-duplicates, written to {args.out}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
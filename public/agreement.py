@@ -0,0 +1,304 @@
+"""
+Inter-annotator Agreement for Data Annotation Website
+
+This module packs stored ratings into a compact NumPy array of shape
+(items, annotators, criteria), where an item is one answer to one question
+and 0 marks a missing rating. Agreement is computed from that array with
+vectorized operations:
+
+  - Fleiss' kappa (generalized to a varying number of raters per item)
+  - Krippendorff's alpha with interval and nominal distance metrics
+  - mean pairwise Cohen's kappa over annotator pairs sharing enough items
+  - pairwise consistency of `preferredAnswer` choices per question
+
+Confidence intervals come from a percentile bootstrap over items, where
+every bootstrap replicate is a row of multinomial item weights so all
+replicates are evaluated with a few matrix products.
+
+Results are cached per response version and only recomputed after new
+responses are stored; the caches keep the most recently requested reports. NumPy is required for this module only.
+"""
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from stats_engine import DEFAULT_CRITERIA
+
+# Largest rating value that can be packed; 0 is reserved for "not rated"
+MAX_RATING = 127
+
+
+class PackedRatings:
+    """Ratings of every annotator on every item, plus preferred-answer choices."""
+
+    def __init__(self, items, annotators, criteria, ratings, questions, preferences):
+        self.items = items
+        self.annotators = annotators
+        self.criteria = criteria
+        # int8 (items, annotators, criteria); 0 means not rated
+        self.ratings = ratings
+        self.questions = questions
+        # int16 (questions, annotators); -1 means no preference given
+        self.preferences = preferences
+
+
+def pack_ratings(responses, domain=None):
+    """Pack an iterable of stored responses into a PackedRatings array."""
+    items = {}
+    annotators = {}
+    criteria = {c: i for i, c in enumerate(DEFAULT_CRITERIA)}
+    rows, cols, crits, values = [], [], [], []
+    questions = {}
+    choices = {}
+    preferences = {}
+
+    for response in responses:
+        if domain is not None and response.get('domain') != domain:
+            continue
+        user_id = response.get('user_id')
+        question_id = response.get('questionId')
+        if user_id is None or question_id is None:
+            continue
+        annotator = annotators.setdefault(user_id, len(annotators))
+
+        ratings = response.get('ratings')
+        if isinstance(ratings, dict) and 'answerId' in response:
+            item = items.setdefault((response.get('domain'), question_id, response['answerId']), len(items))
+            for criterion, value in ratings.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                if value != int(value) or not 1 <= value <= MAX_RATING:
+                    continue
+                rows.append(item)
+                cols.append(annotator)
+                crits.append(criteria.setdefault(criterion, len(criteria)))
+                values.append(int(value))
+
+        preferred = response.get('preferredAnswer')
+        if preferred is not None:
+            question = questions.setdefault((response.get('domain'), question_id), len(questions))
+            options = choices.setdefault(question, {})
+            preferences[(question, annotator)] = options.setdefault(preferred, len(options))
+
+    packed = np.zeros((len(items), len(annotators), len(criteria)), dtype=np.int8)
+    if values:
+        # A later rating of the same item by the same annotator replaces the earlier one
+        packed[rows, cols, crits] = values
+
+    prefs = np.full((len(questions), len(annotators)), -1, dtype=np.int16)
+    if preferences:
+        keys = np.array(list(preferences.keys()), dtype=np.int64)
+        prefs[keys[:, 0], keys[:, 1]] = list(preferences.values())
+
+    return PackedRatings(list(items), list(annotators), list(criteria), packed,
+                         list(questions), prefs)
+
+
+def category_counts(matrix, missing):
+    """Count, per row, how many annotators chose each category.
+
+    `matrix` is (items, annotators) of category codes; cells equal to
+    `missing` are ignored. Returns an (items, categories) float array.
+    """
+    rated = matrix != missing
+    codes = matrix.astype(np.int64) - (missing + 1)
+    categories = int(codes[rated].max()) + 1 if rated.any() else 1
+    rows = np.nonzero(rated)[0]
+    flat = rows * categories + codes[rated]
+    counts = np.bincount(flat, minlength=matrix.shape[0] * categories)
+    return counts.reshape(matrix.shape[0], categories).astype(np.float64)
+
+
+def _bootstrap_weights(n_items, samples, rng):
+    """Row 0 weighs every item once; the other rows are bootstrap resamples."""
+    weights = np.ones((1, n_items))
+    if samples > 0 and n_items > 0:
+        resamples = rng.multinomial(n_items, np.full(n_items, 1.0 / n_items), size=samples)
+        weights = np.vstack([weights, resamples])
+    return weights
+
+
+def fleiss_kappa(counts, weights):
+    """Fleiss' kappa for each row of item weights. `counts` is (items, categories)."""
+    n = counts.sum(axis=1)
+    agreement = (counts * (counts - 1)).sum(axis=1) / (n * (n - 1))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        observed = (weights @ agreement) / weights.sum(axis=1)
+        proportions = (weights @ counts) / (weights @ n)[:, None]
+        expected = (proportions ** 2).sum(axis=1)
+        return (observed - expected) / (1 - expected)
+
+
+def krippendorff_alpha(counts, weights, metric='interval'):
+    """Krippendorff's alpha for each row of item weights. `counts` is (items, categories)."""
+    n = counts.sum(axis=1)
+    k = counts.shape[1]
+    # Per-item coincidence matrices, (items, categories, categories)
+    coincidences = (counts[:, :, None] * counts[:, None, :] - counts[:, :, None] * np.eye(k)) \
+        / (n - 1)[:, None, None]
+    observed = np.einsum('bi,ikl->bkl', weights, coincidences)
+
+    values = np.arange(k, dtype=np.float64)
+    if metric == 'interval':
+        delta = (values[:, None] - values[None, :]) ** 2
+    elif metric == 'nominal':
+        delta = 1.0 - np.eye(k)
+    else:
+        raise ValueError(f"Unknown distance metric: {metric}")
+
+    marginals = observed.sum(axis=2)
+    total = marginals.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        disagreement = (observed * delta).sum(axis=(1, 2))
+        expected = (marginals[:, :, None] * marginals[:, None, :] * delta).sum(axis=(1, 2)) / (total - 1)
+        return 1 - disagreement / expected
+
+
+def pairwise_cohen_kappa(matrix, min_overlap=2):
+    """Cohen's kappa for every annotator pair sharing at least `min_overlap` items.
+
+    `matrix` is (items, annotators) with 0 for missing ratings. Returns a 1-D
+    array of kappas, one per qualifying pair. Pairs are enumerated per item
+    from the ratings that exist, so sparse matrices cost no more than their
+    ratings.
+    """
+    items, annotators = np.nonzero(matrix)
+    values, codes = np.unique(matrix[items, annotators], return_inverse=True)
+    codes = codes.ravel()
+
+    # np.nonzero orders ratings by item, then annotator: pair each rating with
+    # the later ratings of the same item, one offset at a time
+    firsts, seconds = [], []
+    offset = 1
+    while True:
+        same = np.nonzero(items[offset:] == items[:len(items) - offset])[0]
+        if not len(same):
+            break
+        firsts.append(same)
+        seconds.append(same + offset)
+        offset += 1
+    if not firsts:
+        return np.zeros(0)
+    first = np.concatenate(firsts)
+    second = np.concatenate(seconds)
+
+    pair_ids = annotators[first] * matrix.shape[1] + annotators[second]
+    _, inverse, overlap = np.unique(pair_ids, return_inverse=True, return_counts=True)
+    keep = overlap[inverse.ravel()] >= min_overlap
+    if not keep.any():
+        return np.zeros(0)
+    first, second = first[keep], second[keep]
+    _, pair, overlap = np.unique(pair_ids[keep], return_inverse=True, return_counts=True)
+    pair = pair.ravel()
+    pairs, categories = len(overlap), len(values)
+
+    agree = np.bincount(pair, weights=codes[first] == codes[second], minlength=pairs)
+    # Each annotator's use of each category on the items the pair shares
+    chose_first = np.bincount(pair * categories + codes[first], minlength=pairs * categories)
+    chose_second = np.bincount(pair * categories + codes[second], minlength=pairs * categories)
+    expected = (chose_first * chose_second).reshape(pairs, categories).sum(axis=1)
+
+    shared = overlap.astype(np.float64)
+    observed = agree / shared
+    chance = expected / (shared * shared)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        kappa = (observed - chance) / (1 - chance)
+    return kappa[np.isfinite(kappa)]
+
+
+def _interval(estimates, confidence):
+    point = estimates[0]
+    replicates = estimates[1:]
+    replicates = replicates[np.isfinite(replicates)]
+    result = {'estimate': float(point) if np.isfinite(point) else None, 'ci': None}
+    if replicates.size:
+        tail = (1 - confidence) / 2 * 100
+        low, high = np.percentile(replicates, [tail, 100 - tail])
+        result['ci'] = [float(low), float(high)]
+    return result
+
+
+def agreement_report(packed, bootstrap=200, confidence=0.95, seed=0, min_overlap=2):
+    """Compute every agreement statistic for a PackedRatings array."""
+    rng = np.random.default_rng(seed)
+    report = {
+        'items': len(packed.items),
+        'annotators': len(packed.annotators),
+        'bootstrap': {'samples': bootstrap, 'confidence': confidence},
+        'criteria': {},
+    }
+
+    for index, criterion in enumerate(packed.criteria):
+        matrix = packed.ratings[:, :, index]
+        counts = category_counts(matrix, missing=0)
+        counts = counts[counts.sum(axis=1) >= 2]
+        if not len(counts):
+            continue
+        weights = _bootstrap_weights(len(counts), bootstrap, rng)
+        kappas = pairwise_cohen_kappa(matrix, min_overlap)
+        report['criteria'][criterion] = {
+            'items': len(counts),
+            'fleiss_kappa': _interval(fleiss_kappa(counts, weights), confidence),
+            'krippendorff_alpha': _interval(krippendorff_alpha(counts, weights, 'interval'), confidence),
+            'krippendorff_alpha_nominal': _interval(krippendorff_alpha(counts, weights, 'nominal'), confidence),
+            'cohen_kappa': {
+                'pairs': int(kappas.size),
+                'mean': float(kappas.mean()) if kappas.size else None,
+                'median': float(np.median(kappas)) if kappas.size else None,
+            },
+        }
+
+    counts = category_counts(packed.preferences, missing=-1) if packed.preferences.size else np.zeros((0, 1))
+    counts = counts[counts.sum(axis=1) >= 2]
+    preference = {'questions': len(counts), 'pairwise_agreement': None}
+    if len(counts):
+        n = counts.sum(axis=1)
+        agreement = (counts * (counts - 1)).sum(axis=1) / (n * (n - 1))
+        weights = _bootstrap_weights(len(counts), bootstrap, rng)
+        preference['pairwise_agreement'] = _interval((weights @ agreement) / weights.sum(axis=1), confidence)
+    report['preference'] = preference
+    return report
+
+
+class AgreementAnalytics:
+    """Caches packed ratings and reports until the response version changes.
+
+    Both caches are LRUs, since every domain and parameter combination a
+    client asks for gets its own entry.
+    """
+
+    def __init__(self, max_reports=32, max_packed=8):
+        self.max_reports = max_reports
+        self.max_packed = max_packed
+        self._lock = threading.Lock()
+        self._version = None
+        self._packed = OrderedDict()
+        self._reports = OrderedDict()
+
+    def report(self, version, load_responses, domain=None, **params):
+        """Return the agreement report, recomputing only if `version` changed."""
+        key = (domain, tuple(sorted(params.items())))
+        with self._lock:
+            if version != self._version:
+                self._version = version
+                self._packed.clear()
+                self._reports.clear()
+            if key in self._reports:
+                self._reports.move_to_end(key)
+                return self._reports[key]
+
+            packed = self._packed.get(domain)
+            if packed is None:
+                packed = self._packed[domain] = pack_ratings(load_responses(), domain)
+                if len(self._packed) > self.max_packed:
+                    self._packed.popitem(last=False)
+            else:
+                self._packed.move_to_end(domain)
+            report = agreement_report(packed, **params)
+            report['version'] = version
+            self._reports[key] = report
+            if len(self._reports) > self.max_reports:
+                self._reports.popitem(last=False)
+            return report
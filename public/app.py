@@ -9,24 +9,84 @@ and tracks which questions have already been reviewed.
 
 import os
 import json
-import random
+import math
+import time
+import threading
 from datetime import datetime
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
+from question_index import QuestionIndex, domain_key
+from response_log import ResponseLog, iter_records, iter_records_from, migrate_json
+from stats_engine import StatsEngine, BUCKET_PREFIX
+from question_sampler import QuestionSampler, QuestionsClaimed
+from lease_manager import LeaseManager
+from payload_cache import PayloadCache
+from export_stream import (EXPORT_FORMATS, ExportFilter, chunked, collect_page,
+                           decode_cursor, encode_cursor, gzip_stream, serialize)
+try:
+    from agreement import AgreementAnalytics
+except ImportError:  # NumPy is only needed for /api/agreement
+    AgreementAnalytics = None
+from metrics import (SamplingProfiler, bytes_read, bytes_written, file_sizes, instrumented,
+                     registry, request_seconds, slow_requests)
 
 app = Flask(__name__)
-CORS(app)  # Enable CORS for all routes
+# Enable CORS for all routes; browsers only let clients read the custom headers listed here
+CORS(app, expose_headers=['X-Lease-Id', 'X-Lease-TTL', 'X-Next-Cursor'])
 
 # Data storage paths
-DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+DATA_DIR = os.environ.get('ANNOTATION_DATA_DIR') or os.path.join(os.path.dirname(__file__), 'data')
 RESPONSES_FILE = os.path.join(DATA_DIR, 'responses.json')
+RESPONSE_LOG_FILE = os.path.join(DATA_DIR, 'responses.jsonl')
 REVIEWED_FILE = os.path.join(DATA_DIR, 'reviewed_questions.json')
+# Near-duplicate clusters written by near_duplicates.py
+CLUSTERS_FILE = os.environ.get('DUPLICATE_CLUSTERS_FILE') or os.path.join(DATA_DIR, 'duplicate-clusters.json')
+
+# Largest page returned by a single paginated export request
+MAX_EXPORT_LIMIT = 10000
+
+# Largest number of questions or responses handled by one batch request
+MAX_BATCH_SIZE = 100
+
+REQUIRED_RESPONSE_FIELDS = ['user_id', 'domain', 'questionId', 'answerId', 'ratings']
+
+# Identifier fields are used as dictionary keys, so only scalar ids are accepted
+ID_FIELDS = ['user_id', 'domain', 'questionId', 'answerId']
+
+# Largest number of bootstrap resamples accepted by /api/agreement
+MAX_BOOTSTRAP_SAMPLES = 2000
+
+# Requests slower than this are logged; 0 disables the slow-request log
+SLOW_REQUEST_SECONDS = float(os.environ.get('SLOW_REQUEST_MS', 0)) / 1000
+
+# Requests sent with "X-Profile: 1" are profiled into this directory when it is set
+PROFILE_DIR = os.environ.get('PROFILE_DIR')
+
+# Response storage: "log" appends to responses.jsonl, "json" rewrites responses.json
+RESPONSE_STORAGE = os.environ.get('RESPONSE_STORAGE', 'log')
+
+# Parsed domain questions, shared by all requests in this process
+question_index = QuestionIndex(DATA_DIR)
+
+# Serialized and precompressed /api/question payloads
+payload_cache = PayloadCache(max_entries=int(os.environ.get('PAYLOAD_CACHE_SIZE', 4096)))
 
 # Create data directory if it doesn't exist
 os.makedirs(DATA_DIR, exist_ok=True)
 
 # Initialize data files if they don't exist
-if not os.path.exists(RESPONSES_FILE):
+response_log = None
+if RESPONSE_STORAGE == 'log':
+    # One-shot migration of responses collected before the log existed
+    if not os.path.exists(RESPONSE_LOG_FILE) and os.path.exists(RESPONSES_FILE):
+        migrate_json(RESPONSES_FILE, RESPONSE_LOG_FILE)
+    response_log = ResponseLog(
+        RESPONSE_LOG_FILE,
+        fsync=os.environ.get('RESPONSE_LOG_FSYNC', 'batch'),
+        batch_size=int(os.environ.get('RESPONSE_LOG_BATCH_SIZE', 32)),
+        batch_interval=float(os.environ.get('RESPONSE_LOG_BATCH_INTERVAL', 0))
+    )
+elif not os.path.exists(RESPONSES_FILE):
     with open(RESPONSES_FILE, 'w') as f:
         json.dump([], f)
 
@@ -34,57 +94,202 @@ if not os.path.exists(REVIEWED_FILE):
     with open(REVIEWED_FILE, 'w') as f:
         json.dump({}, f)
 
+# Serializes the read-modify-write updates of whole JSON files
+json_file_lock = threading.Lock()
 
-def load_domain_questions(domain):
-    """Load questions for a specific domain from JSON file."""
-    domain_file = os.path.join(DATA_DIR, f"{domain.lower().replace(' ', '-')}-questions.json")
+
+@instrumented('load_domain_entry')
+def load_domain_entry(domain):
+    """Load the question index entry for a domain, or None if it cannot be loaded."""
     try:
-        with open(domain_file, 'r') as f:
-            return json.load(f)['questions']
+        return question_index.entry(domain)
     except (FileNotFoundError, json.JSONDecodeError, KeyError) as e:
         print(f"Error loading domain questions: {e}")
-        return []
+        return None
 
 
+@instrumented('load_domain_questions')
+def load_domain_questions(domain):
+    """Load questions for a specific domain from the in-memory question index."""
+    entry = load_domain_entry(domain)
+    return entry.questions if entry is not None else []
+
+
+@instrumented('load_reviewed_questions')
 def load_reviewed_questions():
     """Load the list of questions that have already been reviewed."""
     try:
-        with open(REVIEWED_FILE, 'r') as f:
-            return json.load(f)
+        with open(REVIEWED_FILE, 'rb') as f:
+            data = f.read()
+        bytes_read.inc(len(data), file='reviewed_questions.json')
+        return json.loads(data)
     except (FileNotFoundError, json.JSONDecodeError) as e:
         print(f"Error loading reviewed questions: {e}")
         return {}
 
 
-def save_reviewed_question(user_id, question_id):
-    """Save a question as reviewed for a specific user."""
-    reviewed = load_reviewed_questions()
-    
-    if user_id not in reviewed:
-        reviewed[user_id] = []
-    
-    if question_id not in reviewed[user_id]:
-        reviewed[user_id].append(question_id)
-    
-    with open(REVIEWED_FILE, 'w') as f:
-        json.dump(reviewed, f)
+def replace_file(path, data):
+    """Write a whole file through a temporary file so a crash never leaves it torn."""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+@instrumented('load_duplicate_clusters')
+def load_duplicate_clusters():
+    """Load near-duplicate clusters as lists of (domain, question_id) members."""
+    try:
+        with open(CLUSTERS_FILE, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return []
+    bytes_read.inc(len(data), file='duplicate-clusters.json')
+    try:
+        clusters = json.loads(data)['clusters']
+        return [[(m['domain'], m['id']) for m in c['members']] for c in clusters]
+    except (json.JSONDecodeError, KeyError, TypeError) as e:
+        print(f"Error loading duplicate clusters: {e}")
+        return []
+
+
+@instrumented('save_reviewed_question')
+def save_reviewed_question(user_id, domain, question_id):
+    """Save a question of a domain as reviewed for a specific user."""
+    save_reviewed_questions([(user_id, domain, question_id)])
+
+
+@instrumented('save_reviewed_questions')
+def save_reviewed_questions(entries):
+    """Save several (user_id, domain, question_id) entries as reviewed with a single write.
+
+    Reviewed ids are kept per user and domain; ids from files written before
+    domains were recorded stay under the "" domain. The file is only written
+    with "json" response storage; the log is the record of reviews otherwise.
+    """
+    with json_file_lock:
+        reviewed = load_reviewed_questions()
+        
+        for user_id, domain, question_id in entries:
+            if isinstance(reviewed.get(user_id), list):
+                reviewed[user_id] = {'': reviewed[user_id]}
+            question_ids = reviewed.setdefault(user_id, {}).setdefault(domain_key(domain), [])
+            
+            if question_id not in question_ids:
+                question_ids.append(question_id)
+        
+        data = json.dumps(reviewed)
+        replace_file(REVIEWED_FILE, data)
+    bytes_written.inc(len(data), file='reviewed_questions.json')
+
+
+@instrumented('load_responses')
+def load_responses():
+    """Load every stored response from the configured storage."""
+    if response_log is not None:
+        responses = list(iter_records(RESPONSE_LOG_FILE))
+        bytes_read.inc(sum(os.path.getsize(p) for p in response_log.segments() if os.path.exists(p)),
+                       file='responses.jsonl')
+        return responses
+    with open(RESPONSES_FILE, 'rb') as f:
+        data = f.read()
+    bytes_read.inc(len(data), file='responses.json')
+    return json.loads(data)
+
+
+def load_valid_responses():
+    """Load stored responses, skipping records that fail response validation."""
+    return [r for r in load_responses() if response_error(r) is None]
 
 
+def iter_responses(position=(0, 0)):
+    """Return an iterator of (response, position) pairs starting at a storage position."""
+    if response_log is not None:
+        return iter_records_from(RESPONSE_LOG_FILE, position)
+    responses = load_responses()
+    start = position[1]
+    return ((r, (0, i + 1)) for i, r in enumerate(responses[start:], start))
+
+
+@instrumented('save_response')
 def save_response(response_data):
     """Save a user's response to the responses file."""
+    save_responses([response_data])
+
+
+@instrumented('save_responses')
+def save_responses(new_responses):
+    """Save several responses with a single storage write."""
+    # Add timestamp to the responses
+    timestamp = datetime.now().isoformat()
+    for response_data in new_responses:
+        response_data['timestamp'] = timestamp
+
+    if response_log is not None:
+        bytes_written.inc(response_log.append_many(new_responses), file='responses.jsonl')
+        return
+
+    with json_file_lock:
+        try:
+            responses = load_responses()
+        except (FileNotFoundError, json.JSONDecodeError):
+            responses = []
+        
+        responses.extend(new_responses)
+        
+        data = json.dumps(responses, indent=2)
+        replace_file(RESPONSES_FILE, data)
+    bytes_written.inc(len(data), file='responses.json')
+
+
+def _data_files():
+    """Return the data files whose sizes are exported as metrics."""
     try:
-        with open(RESPONSES_FILE, 'r') as f:
-            responses = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        responses = []
-    
-    # Add timestamp to the response
-    response_data['timestamp'] = datetime.now().isoformat()
-    
-    responses.append(response_data)
-    
-    with open(RESPONSES_FILE, 'w') as f:
-        json.dump(responses, f, indent=2)
+        names = os.listdir(DATA_DIR)
+    except FileNotFoundError:
+        return []
+    return [os.path.join(DATA_DIR, n) for n in sorted(names)
+            if n.endswith(('.json', '.jsonl')) or '.jsonl.' in n]
+
+
+@app.before_request
+def start_request_timer():
+    """Start timing the request and, if asked for, profiling it."""
+    g.request_started = time.perf_counter()
+    if PROFILE_DIR and request.headers.get('X-Profile') == '1':
+        g.profiler = SamplingProfiler(threading.get_ident()).start()
+
+
+@app.after_request
+def record_request_metrics(response):
+    """Record request latency once the response body has been fully sent."""
+    started = g.get('request_started', time.perf_counter())
+    profiler = g.pop('profiler', None)
+    endpoint = request.endpoint or 'unknown'
+    method = request.method
+    path = request.full_path.rstrip('?')
+    status = str(response.status_code)
+
+    def finish():
+        elapsed = time.perf_counter() - started
+        request_seconds.observe(elapsed, endpoint=endpoint, method=method, status=status)
+        if SLOW_REQUEST_SECONDS and elapsed >= SLOW_REQUEST_SECONDS:
+            slow_requests.inc(endpoint=endpoint)
+            print(f"Slow request: {method} {path} returned {status} in {elapsed * 1000:.1f} ms")
+        if profiler is not None:
+            profiler.stop()
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            profile_path = os.path.join(PROFILE_DIR, f"{datetime.now():%Y%m%dT%H%M%S%f}-{endpoint}.folded")
+            profiler.write_folded(profile_path)
+
+    # Streamed bodies are still being generated, so time them until the server closes them
+    if response.is_streamed:
+        response.call_on_close(finish)
+    else:
+        finish()
+    return response
 
 
 @app.route('/api/question', methods=['GET'])
@@ -97,108 +302,415 @@ def get_random_question():
         return jsonify({'error': 'Domain parameter is required'}), 400
     
     # Load questions for the domain
-    questions = load_domain_questions(domain)
-    if not questions:
+    questions = load_domain_entry(domain)
+    if questions is None or not questions.ids:
         return jsonify({'error': f'No questions found for domain: {domain}'}), 404
     
-    # Load reviewed questions for this user
-    reviewed = load_reviewed_questions().get(user_id, [])
+    # Draw from the questions this user has not reviewed and nobody else has leased
+    try:
+        selected = sampler.sample(domain, user_id, questions, lease_claim(domain, user_id))
+    except QuestionsClaimed as e:
+        return questions_claimed_response(domain, e.question_ids)
+    if selected is None:
+        return jsonify({'message': 'All questions have been reviewed'}), 204
     
-    # Filter out already reviewed questions
-    available_questions = [q for q in questions if q['id'] not in reviewed]
+    selected_question, selected_answer = selected
+    # A question the user skipped goes back to other annotators
+    lease_manager.release_others(domain, user_id, {selected_question['id']})
+    if selected_answer is not None:
+        return question_payload_response(domain, questions, selected_question, selected_answer)
+    else:
+        lease_manager.release(domain, selected_question['id'], user_id)
+        return jsonify({'error': 'No answers found for the selected question'}), 500
+
+
+def question_payload_response(domain, entry, question, answer):
+    """Serve a cached question payload, honoring If-None-Match and Accept-Encoding.
+
+    The body only depends on the (question, answer) pair so it can be cached
+    and validated; the lease is per request and is sent in headers instead.
+    """
+    payload = payload_cache.get(domain, entry, question, answer)
+    lease = lease_manager.get(domain, question['id'])
+    headers = {'Vary': 'Accept-Encoding', 'Cache-Control': 'private, no-cache'}
+    if lease is not None:
+        headers['X-Lease-Id'] = lease.lease_id
+        headers['X-Lease-TTL'] = str(lease_manager.ttl)
+
+    if request.if_none_match.contains_weak(payload.etag):
+        response = Response(status=304, headers=headers)
+    else:
+        encoding, body = payload.negotiate(request.accept_encodings.quality)
+        if encoding is not None:
+            headers['Content-Encoding'] = encoding
+        response = Response(body, mimetype='application/json', headers=headers)
+    response.set_etag(payload.etag, weak=True)
+    return response
+
+
+def lease_claim(domain, user_id):
+    """Return a sampler claim callback that leases questions to a user."""
+    def claim(question_id):
+        return lease_manager.acquire(domain, question_id, user_id) is not None
+    return claim
+
+
+def questions_claimed_response(domain, question_ids):
+    """Tell a user to retry once the first lease on the questions left to them expires."""
+    retry_after = lease_manager.retry_after(domain, question_ids)
+    response = jsonify({'message': 'All remaining questions are reserved by other annotators'})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after or 0)))
+    return response
+
+
+def lease_payload(domain, question_id):
+    """Describe the lease a user holds on a question for API responses."""
+    lease = lease_manager.get(domain, question_id)
+    if lease is None:
+        return None
+    return {'id': lease.lease_id, 'ttl': lease_manager.ttl}
+
+
+def response_error(item):
+    """Return why a response cannot be stored, or None if it is valid."""
+    if not isinstance(item, dict):
+        return 'Response must be an object'
+    missing_fields = [field for field in REQUIRED_RESPONSE_FIELDS if field not in item]
+    if missing_fields:
+        return f'Missing required fields: {", ".join(missing_fields)}'
+    id_fields = ID_FIELDS + ['idempotencyKey'] if 'idempotencyKey' in item else ID_FIELDS
+    invalid_fields = [field for field in id_fields
+                      if isinstance(item[field], bool) or not isinstance(item[field], (str, int))]
+    if invalid_fields:
+        return f'Fields must be strings or integers: {", ".join(invalid_fields)}'
+    if not isinstance(item['ratings'], dict):
+        return 'ratings must be an object'
+    return None
+
+
+def store_responses(items, batch_key=None):
+    """Validate and persist responses in one storage write, returning a result per item.
+
+    Items carrying an `idempotencyKey` their user already stored are reported
+    as duplicates and not stored again. When `batch_key` is given, items
+    without their own key get `<batch_key>:<index>`.
+    """
+    results = []
+    accepted = []
+    with submit_lock:
+        batch_keys = set()
+        for index, item in enumerate(items):
+            error = response_error(item)
+            if error:
+                results.append({'index': index, 'status': 'error', 'error': error})
+                continue
+            
+            if 'idempotencyKey' not in item and batch_key:
+                item['idempotencyKey'] = f'{batch_key}:{index}'
+            key = (item['user_id'], item['idempotencyKey']) if 'idempotencyKey' in item else None
+            if key is not None and (key in idempotency_keys or key in batch_keys):
+                results.append({'index': index, 'status': 'duplicate'})
+                continue
+            if key is not None:
+                batch_keys.add(key)
+            
+            accepted.append(item)
+            results.append({'index': index, 'status': 'created'})
+        
+        # Reserve the keys so a concurrent retry is reported as a duplicate
+        idempotency_keys.update(batch_keys)
     
-    if not available_questions:
-        return jsonify({'message': 'All questions have been reviewed'}), 204
+    if not accepted:
+        return results
+    
+    # Written outside submit_lock so concurrent submissions share the log's group commit
+    try:
+        save_responses(accepted)
+    except Exception:
+        with submit_lock:
+            idempotency_keys.difference_update(batch_keys)
+        raise
+    # The log already records who reviewed what; the legacy JSON storage keeps a separate file
+    if response_log is None:
+        save_reviewed_questions([(r['user_id'], r['domain'], r['questionId']) for r in accepted])
+    
+    for response in accepted:
+        stats_engine.record(response)
+        sampler.record_annotation(response)
+        sampler.mark_reviewed(response['user_id'], response['questionId'], response['domain'])
+        lease_manager.commit(response['domain'], response['questionId'], response['user_id'])
+    
+    return results
+
+
+@app.route('/api/questions/batch', methods=['GET'])
+def get_question_batch():
+    """API endpoint to get several distinct unreviewed questions in one call."""
+    domain = request.args.get('domain', '')
+    user_id = request.args.get('user_id', 'anonymous')
+    n = request.args.get('n', '10')
+    
+    if not domain:
+        return jsonify({'error': 'Domain parameter is required'}), 400
+    if not n.isdecimal() or not 0 < int(n) <= MAX_BATCH_SIZE:
+        return jsonify({'error': f'n must be between 1 and {MAX_BATCH_SIZE}'}), 400
+    n = int(n)
     
-    # Select a random question
-    selected_question = random.choice(available_questions)
+    questions = load_domain_entry(domain)
+    if questions is None or not questions.ids:
+        return jsonify({'error': f'No questions found for domain: {domain}'}), 404
+    
+    try:
+        selected = sampler.sample_many(domain, user_id, questions, n, lease_claim(domain, user_id))
+    except QuestionsClaimed as e:
+        return questions_claimed_response(domain, e.question_ids)
+    if not selected:
+        return jsonify({'message': 'All questions have been reviewed'}), 204
     
-    # Select a random answer for this question
-    if 'answers' in selected_question and selected_question['answers']:
-        selected_answer = random.choice(selected_question['answers'])
-        return jsonify({
-            'question': selected_question,
-            'selected_answer': selected_answer
+    # Questions without answers cannot be annotated
+    items = []
+    for question, answer in selected:
+        if answer is None:
+            lease_manager.release(domain, question['id'], user_id)
+            continue
+        items.append({
+            'question': question,
+            'selected_answer': answer,
+            'lease': lease_payload(domain, question['id'])
         })
-    else:
-        return jsonify({'error': 'No answers found for the selected question'}), 500
+    return jsonify({'items': items})
 
 
 @app.route('/api/response', methods=['POST'])
 def submit_response():
     """API endpoint to submit a response."""
-    data = request.json
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Response must be a JSON object'}), 400
     
     # Validate required fields
-    required_fields = ['user_id', 'domain', 'questionId', 'answerId', 'ratings']
-    missing_fields = [field for field in required_fields if field not in data]
+    missing_fields = [field for field in REQUIRED_RESPONSE_FIELDS if field not in data]
     
     if missing_fields:
         return jsonify({'error': f'Missing required fields: {", ".join(missing_fields)}'}), 400
     
-    # Save the response
-    save_response(data)
+    # A retried submission sent with the same Idempotency-Key header is stored once
+    if 'idempotencyKey' not in data and request.headers.get('Idempotency-Key'):
+        data['idempotencyKey'] = request.headers['Idempotency-Key']
     
-    # Mark the question as reviewed for this user
-    save_reviewed_question(data['user_id'], data['questionId'])
+    result = store_responses([data])[0]
+    if result['status'] == 'error':
+        return jsonify({'error': result['error']}), 400
+    if result['status'] == 'duplicate':
+        return jsonify({'success': True, 'duplicate': True})
     
     return jsonify({'success': True})
 
 
+@app.route('/api/responses/batch', methods=['POST'])
+def submit_response_batch():
+    """API endpoint to submit several responses in one storage write."""
+    data = request.get_json(silent=True)
+    items = data.get('responses') if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        return jsonify({'error': 'Expected a list of responses'}), 400
+    if len(items) > MAX_BATCH_SIZE:
+        return jsonify({'error': f'At most {MAX_BATCH_SIZE} responses per batch'}), 400
+    
+    results = store_responses(items, request.headers.get('Idempotency-Key'))
+    return jsonify({
+        'success': all(r['status'] != 'error' for r in results),
+        'results': results
+    })
+
+
+@app.route('/api/lease/release', methods=['POST'])
+def release_lease():
+    """API endpoint to give a leased question back before its lease expires."""
+    data = request.get_json(silent=True) or {}
+    
+    missing_fields = [field for field in ['user_id', 'domain', 'questionId'] if field not in data]
+    if missing_fields:
+        return jsonify({'error': f'Missing required fields: {", ".join(missing_fields)}'}), 400
+    
+    released = lease_manager.release(data['domain'], data['questionId'], data['user_id'])
+    return jsonify({'success': True, 'released': released})
+
+
+@app.route('/api/leases', methods=['GET'])
+def get_lease_stats():
+    """API endpoint to get lease churn and expiry counters."""
+    return jsonify(lease_manager.stats())
+
+
 @app.route('/api/export', methods=['GET'])
 def export_data():
-    """API endpoint to export all response data."""
+    """API endpoint to stream response data, optionally filtered and paginated."""
+    fmt = request.args.get('format', 'json')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f'Unknown export format: {fmt}'}), 400
+
     try:
-        with open(RESPONSES_FILE, 'r') as f:
-            responses = json.load(f)
-        return jsonify(responses)
-    except (FileNotFoundError, json.JSONDecodeError) as e:
-        return jsonify({'error': f'Error exporting data: {str(e)}'}), 500
+        position = decode_cursor(request.args['cursor']) if 'cursor' in request.args else (0, 0)
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    limit = request.args.get('limit')
+    if limit is not None:
+        if not limit.isdecimal() or not 0 < int(limit) <= MAX_EXPORT_LIMIT:
+            return jsonify({'error': f'limit must be between 1 and {MAX_EXPORT_LIMIT}'}), 400
+        limit = int(limit)
+
+    export_filter = ExportFilter.from_args(request.args)
+    records = iter_responses(position)
+
+    headers = {}
+    if limit is None:
+        matching = (r for r, _ in records if export_filter.matches(r))
+    else:
+        # A page is bounded by MAX_EXPORT_LIMIT, so it is gathered up front
+        # to report where the next page starts; the last page has no cursor
+        matching, position = collect_page(records, export_filter, position, limit)
+        if position is not None:
+            headers['X-Next-Cursor'] = encode_cursor(position)
+
+    body = chunked(serialize(matching, fmt))
+    if request.accept_encodings.quality('gzip') > 0 and request.args.get('gzip') != '0':
+        body = gzip_stream(body)
+        headers['Content-Encoding'] = 'gzip'
+        headers['Vary'] = 'Accept-Encoding'
+
+    return Response(body, mimetype=EXPORT_FORMATS[fmt], headers=headers)
 
 
 @app.route('/api/stats', methods=['GET'])
 def get_stats():
     """API endpoint to get annotation statistics."""
+    breakdowns = [b for b in request.args.get('breakdown', '').split(',') if b]
+    bucket = request.args.get('bucket', 'hour')
+    if bucket not in BUCKET_PREFIX:
+        return jsonify({'error': f'Unknown bucket: {bucket}'}), 400
+
+    return jsonify(stats_engine.snapshot(breakdowns, bucket))
+
+
+@app.route('/api/agreement', methods=['GET'])
+def get_agreement():
+    """API endpoint to get inter-annotator agreement, cached until new responses arrive."""
+    if agreement_analytics is None:
+        return jsonify({'error': 'Agreement analytics require NumPy to be installed'}), 501
+    
+    bootstrap = request.args.get('bootstrap', 200, type=int)
+    confidence = request.args.get('confidence', 0.95, type=float)
+    if not 0 <= bootstrap <= MAX_BOOTSTRAP_SAMPLES:
+        return jsonify({'error': f'bootstrap must be between 0 and {MAX_BOOTSTRAP_SAMPLES}'}), 400
+    if not 0 < confidence < 1:
+        return jsonify({'error': 'confidence must be between 0 and 1'}), 400
+    
     try:
-        with open(RESPONSES_FILE, 'r') as f:
-            responses = json.load(f)
-        
-        # Calculate basic statistics
-        stats = {
-            'total_responses': len(responses),
-            'domains': {},
-            'criteria_averages': {
-                'reasoning': 0,
-                'accuracy': 0,
-                'domainKnowledge': 0,
-                'creativity': 0,
-                'difficulty': 0
-            }
-        }
-        
-        # Count responses by domain
-        for response in responses:
-            domain = response.get('domain', 'unknown')
-            if domain not in stats['domains']:
-                stats['domains'][domain] = 0
-            stats['domains'][domain] += 1
-            
-            # Sum ratings for averaging
-            if 'ratings' in response:
-                for criterion, value in response['ratings'].items():
-                    if criterion in stats['criteria_averages']:
-                        stats['criteria_averages'][criterion] += value
-        
-        # Calculate averages
-        for criterion in stats['criteria_averages']:
-            if stats['total_responses'] > 0:
-                stats['criteria_averages'][criterion] = round(
-                    stats['criteria_averages'][criterion] / stats['total_responses'], 2
-                )
-        
-        return jsonify(stats)
+        report = agreement_analytics.report(
+            stats_engine.total, load_valid_responses,
+            domain=request.args.get('domain') or None,
+            bootstrap=bootstrap,
+            confidence=confidence,
+            seed=request.args.get('seed', 0, type=int),
+            min_overlap=max(1, request.args.get('min_overlap', 2, type=int))
+        )
     except (FileNotFoundError, json.JSONDecodeError) as e:
-        return jsonify({'error': f'Error fetching stats: {str(e)}'}), 500
+        return jsonify({'error': f'Error computing agreement: {str(e)}'}), 500
+    return jsonify(report)
+
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Endpoint exposing metrics in the Prometheus text format."""
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/api/question-index', methods=['GET'])
+def get_question_index_stats():
+    """API endpoint to get question index cache counters."""
+    return jsonify(dict(question_index.stats(), payloads=payload_cache.stats()))
+
+
+# Running statistics and annotation counts, rebuilt from storage once per process
+stats_engine = StatsEngine()
+sampler = QuestionSampler(
+    strategy=os.environ.get('SAMPLER_STRATEGY', 'least-annotated'),
+    seed=int(os.environ['SAMPLER_SEED']) if os.environ.get('SAMPLER_SEED') else None
+)
+
+# Agreement reports, recomputed only after new responses are stored
+agreement_analytics = AgreementAnalytics() if AgreementAnalytics is not None else None
+
+# Questions handed out but not yet answered, reserved for LEASE_TTL seconds
+lease_manager = LeaseManager(ttl=float(os.environ.get('LEASE_TTL', 600)))
+
+# (user_id, idempotency key) of stored responses, so retried submissions are stored once
+idempotency_keys = set()
+submit_lock = threading.Lock()
+
+
+def reviewed_questions(responses):
+    """Merge reviewed_questions.json with the (user, domain, question) of every stored response."""
+    reviewed = {}
+    for user_id, domains in load_reviewed_questions().items():
+        if isinstance(domains, list):
+            domains = {'': domains}
+        reviewed[user_id] = {d: set(question_ids) for d, question_ids in domains.items()}
+    for response in responses:
+        domains = reviewed.setdefault(response['user_id'], {})
+        domains.setdefault(domain_key(response['domain']), set()).add(response['questionId'])
+    return reviewed
+
+
+def rebuild_aggregates():
+    """Rebuild running statistics and sampler state from stored data."""
+    try:
+        responses = load_responses()
+    except (FileNotFoundError, json.JSONDecodeError) as e:
+        print(f"Error rebuilding statistics: {e}")
+        responses = []
+    # Records stored before responses were type-checked must not stop the server from starting
+    valid = [r for r in responses if response_error(r) is None]
+    if len(valid) < len(responses):
+        print(f"Skipping {len(responses) - len(valid)} malformed stored responses")
+    responses = valid
+    stats_engine.rebuild(responses)
+    for response in responses:
+        sampler.record_annotation(response)
+        if 'idempotencyKey' in response:
+            idempotency_keys.add((response['user_id'], response['idempotencyKey']))
+    sampler.load_clusters(load_duplicate_clusters())
+    sampler.load_reviewed(reviewed_questions(responses))
+
+
+rebuild_aggregates()
+
+registry.gauge('annotation_data_file_bytes', 'Size of data files on disk.', ['file'],
+               collect=file_sizes(_data_files))
+registry.gauge('annotation_reviewed_users', 'Users with at least one reviewed question.',
+               collect=lambda: [({}, sampler.reviewed_sizes()[0])])
+registry.gauge('annotation_reviewed_questions', 'Reviewed (user, question) pairs.',
+               collect=lambda: [({}, sampler.reviewed_sizes()[1])])
+registry.counter('annotation_question_index_events_total', 'Question index cache hits, misses and reloads.',
+                 ['event'], collect=lambda: [({'event': e}, question_index.stats()[s])
+                                             for e, s in (('hit', 'hits'), ('miss', 'misses'),
+                                                          ('reload', 'reloads'))])
+registry.counter('annotation_payload_cache_events_total', 'Question payload cache hits and misses.',
+                 ['event'], collect=lambda: [({'event': e}, payload_cache.stats()[s])
+                                             for e, s in (('hit', 'hits'), ('miss', 'misses'))])
+registry.gauge('annotation_payload_cache_bytes', 'Bytes held by cached question payloads.',
+               collect=lambda: [({}, payload_cache.stats()['bytes'])])
+registry.gauge('annotation_leases_active', 'Questions currently leased to an annotator.',
+               collect=lambda: [({}, lease_manager.stats()['active'])])
+registry.counter('annotation_lease_events_total', 'Lease grants, renewals, commits, releases and expiries.',
+                 ['event'], collect=lambda: [({'event': e}, v) for e, v in lease_manager.stats().items()
+                                             if e not in ('ttl', 'active')])
+
+# Optionally parse every domain file before serving the first request
+if os.environ.get('WARM_QUESTION_INDEX', '').lower() in ('1', 'true', 'yes'):
+    question_index.warm()
 
 
 if __name__ == '__main__':
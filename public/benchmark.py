@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+"""
+Benchmark Suite for the Data Annotation API
+
+This script measures how the Flask API in app.py behaves as stored
+responses and reviewed questions grow. It has four commands:
+
+  generate  write a synthetic data directory at 1k, 100k or 1M scale
+  micro     time the storage helpers and the stats endpoint in-process
+  load      run a concurrent HTTP load against /api/question, /api/response,
+            /api/stats and /api/export and report throughput and latency
+  compare   compare two result files and flag regressions
+
+Results are written as JSON files recording the commit, scale and storage
+mode, so baselines from different commits can be compared.
+
+Usage:
+    python benchmark.py generate --scale 100k --data-dir /tmp/bench-100k
+    python benchmark.py micro --data-dir /tmp/bench-100k --out results/micro.json
+    python benchmark.py load --data-dir /tmp/bench-100k --duration 30
+    python benchmark.py compare results/base.json results/micro.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import threading
+import subprocess
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+SCALES = {
+    '1k': 1_000,
+    '100k': 100_000,
+    '1M': 1_000_000,
+}
+
+DOMAINS = ['Chemistry', 'Material Science', 'Polymer Design']
+CRITERIA = ['reasoning', 'accuracy', 'domainKnowledge', 'creativity', 'difficulty']
+WORDS = ('polymer monomer bandgap conjugation lattice phase diagram entropy enthalpy '
+         'crystallinity solubility catalyst oxidation reduction ligand electron bond '
+         'modulus viscosity diffusion membrane permeability thermal dielectric').split()
+
+# Description of a generated data directory, recorded in result files
+MANIFEST = 'benchmark-manifest.json'
+
+# Endpoint mix used by the load generator, as relative weights
+LOAD_MIX = {
+    'question': 10,
+    'response': 6,
+    'stats': 2,
+    'export': 1,
+}
+
+
+def _text(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def _domain_file(data_dir, domain):
+    return os.path.join(data_dir, f"{domain.lower().replace(' ', '-')}-questions.json")
+
+
+def generate(data_dir, responses, seed=0, storage='log'):
+    """Write synthetic questions, responses and reviewed questions into data_dir."""
+    rng = random.Random(seed)
+    os.makedirs(data_dir, exist_ok=True)
+
+    users = [f'user{i}@example.com' for i in range(max(10, responses // 100))]
+    questions_per_domain = min(10_000, max(100, responses // 100))
+    question_ids = {}
+    for domain in DOMAINS:
+        prefix = domain.lower().replace(' ', '-')
+        questions = []
+        for q in range(questions_per_domain):
+            question_id = f'{prefix}-q{q}'
+            questions.append({
+                'id': question_id,
+                'text': _text(rng, 30),
+                'answers': [{'id': f'{question_id}-a{a}', 'text': _text(rng, 120)} for a in range(1, 4)]
+            })
+        question_ids[domain] = [q['id'] for q in questions]
+        with open(_domain_file(data_dir, domain), 'w') as f:
+            json.dump({'questions': questions}, f)
+
+    reviewed = {}
+    start = datetime(2025, 1, 1)
+    if storage == 'log':
+        out = open(os.path.join(data_dir, 'responses.jsonl'), 'w')
+    else:
+        out = open(os.path.join(data_dir, 'responses.json'), 'w')
+        out.write('[')
+
+    with out:
+        for i in range(responses):
+            domain = rng.choice(DOMAINS)
+            user_id = rng.choice(users)
+            question_id = rng.choice(question_ids[domain])
+            record = {
+                'user_id': user_id,
+                'domain': domain,
+                'questionId': question_id,
+                'answerId': f'{question_id}-a{rng.randint(1, 3)}',
+                'ratings': {c: rng.randint(1, 5) for c in CRITERIA},
+                'timestamp': (start + timedelta(seconds=i * 30)).isoformat()
+            }
+            if storage == 'log':
+                out.write(json.dumps(record) + '\n')
+            else:
+                out.write((',' if i else '') + json.dumps(record))
+            reviewed.setdefault(user_id, {}).setdefault(domain.lower().replace(' ', '-'), []).append(question_id)
+        if storage != 'log':
+            out.write(']')
+
+    with open(os.path.join(data_dir, 'reviewed_questions.json'), 'w') as f:
+        json.dump({u: {d: list(dict.fromkeys(q)) for d, q in domains.items()}
+                   for u, domains in reviewed.items()}, f)
+
+    with open(os.path.join(data_dir, MANIFEST), 'w') as f:
+        json.dump({'responses': responses, 'users': len(users), 'domains': len(DOMAINS),
+                   'questions_per_domain': questions_per_domain, 'storage': storage, 'seed': seed}, f)
+
+    print(f"Generated {responses} responses, {len(users)} users and "
+          f"{questions_per_domain} questions per domain in {data_dir}")
+
+
+def _dataset(data_dir):
+    """Return the manifest of a generated data directory, if there is one."""
+    if not data_dir:
+        return None
+    try:
+        with open(os.path.join(data_dir, MANIFEST)) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(latencies, elapsed=None):
+    """Summarize latencies in seconds as milliseconds plus optional throughput."""
+    values = sorted(latencies)
+    summary = {
+        'count': len(values),
+        'mean_ms': round(1000 * sum(values) / len(values), 4) if values else 0.0,
+        'p50_ms': round(1000 * _percentile(values, 0.50), 4),
+        'p95_ms': round(1000 * _percentile(values, 0.95), 4),
+        'p99_ms': round(1000 * _percentile(values, 0.99), 4),
+    }
+    if elapsed:
+        summary['throughput_rps'] = round(len(values) / elapsed, 2)
+    return summary
+
+
+def _time(fn, iterations):
+    latencies = []
+    for i in range(iterations):
+        started = time.perf_counter()
+        fn(i)
+        latencies.append(time.perf_counter() - started)
+    return summarize(latencies)
+
+
+def _import_app(data_dir):
+    """Import app.py against a data directory; must run before any other import of app."""
+    os.environ['ANNOTATION_DATA_DIR'] = data_dir
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import app
+    return app
+
+
+def micro(data_dir, iterations):
+    """Time the storage helpers and /api/stats against an existing data directory."""
+    started = time.perf_counter()
+    app = _import_app(data_dir)
+    startup = time.perf_counter() - started
+    client = app.app.test_client()
+    rng = random.Random(1)
+
+    domain = DOMAINS[0]
+    question_ids = list(app.question_index.entry(domain).ids)
+
+    def load_cold(_):
+        app.question_index.invalidate(domain)
+        app.load_domain_questions(domain)
+
+    def save_response(i):
+        question_id = rng.choice(question_ids)
+        app.save_response({
+            'user_id': f'bench{i % 50}@example.com',
+            'domain': domain,
+            'questionId': question_id,
+            'answerId': f'{question_id}-a1',
+            'ratings': {c: rng.randint(1, 5) for c in CRITERIA}
+        })
+
+    def save_reviewed(i):
+        app.save_reviewed_question(f'bench{i % 50}@example.com', domain, rng.choice(question_ids))
+
+    results = {
+        'startup': {'seconds': round(startup, 4)},
+        'load_domain_questions_cold': _time(load_cold, iterations),
+        'load_domain_questions_warm': _time(lambda _: app.load_domain_questions(domain), iterations),
+        'save_response': _time(save_response, iterations),
+        'save_reviewed_question': _time(save_reviewed, iterations),
+        'get_stats': _time(lambda _: client.get('/api/stats'), iterations),
+    }
+    if app.response_log is not None:
+        app.response_log.close()
+    return results
+
+
+def _request(url, body=None):
+    data = json.dumps(body).encode('utf-8') if body is not None else None
+    req = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(req, timeout=60) as resp:
+        payload = resp.read()
+        return resp.status, payload
+
+
+def _start_server(data_dir):
+    """Serve app.py from a background thread on a free local port."""
+    from werkzeug.serving import make_server
+    app = _import_app(data_dir)
+    server = make_server('127.0.0.1', 0, app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+
+def load(base_url, concurrency, duration, users, seed=0):
+    """Run a weighted endpoint mix from `concurrency` threads for `duration` seconds."""
+    names = list(LOAD_MIX)
+    weights = [LOAD_MIX[n] for n in names]
+    deadline = time.perf_counter() + duration
+    lock = threading.Lock()
+    latencies = {n: [] for n in names}
+    errors = {n: 0 for n in names}
+    # Question fetches that served nothing: 204 (all reviewed) and 503 (all reserved)
+    no_content = {n: 0 for n in names}
+    reserved = {n: 0 for n in names}
+
+    def worker(worker_id):
+        rng = random.Random(seed + worker_id)
+        # Question last served to each user, answered later by that same user
+        served = {}
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights)[0]
+            domain = rng.choice(DOMAINS)
+            user_id = f'load{rng.randrange(users)}@example.com'
+            started = time.perf_counter()
+            try:
+                if name == 'question':
+                    status, payload = _request(f'{base_url}/api/question?domain={urllib.parse.quote(domain)}'
+                                               f'&user_id={urllib.parse.quote(user_id)}')
+                    if status == 204:
+                        with lock:
+                            no_content[name] += 1
+                        continue
+                    served[user_id] = (domain, json.loads(payload))
+                elif name == 'response':
+                    if not served:
+                        continue
+                    user_id = rng.choice(list(served))
+                    q_domain, question = served.pop(user_id)
+                    _request(f'{base_url}/api/response', {
+                        'user_id': user_id,
+                        'domain': q_domain,
+                        'questionId': question['question']['id'],
+                        'answerId': question['selected_answer']['id'],
+                        'ratings': {c: rng.randint(1, 5) for c in CRITERIA}
+                    })
+                elif name == 'stats':
+                    _request(f'{base_url}/api/stats')
+                else:
+                    _request(f'{base_url}/api/export?format=ndjson&limit=1000')
+            except urllib.error.HTTPError as e:
+                with lock:
+                    if e.code == 503:
+                        reserved[name] += 1
+                    else:
+                        errors[name] += 1
+                continue
+            except (urllib.error.URLError, OSError):
+                with lock:
+                    errors[name] += 1
+                continue
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies[name].append(elapsed)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    results = {n: dict(summarize(latencies[n], elapsed), errors=errors[n],
+                       no_content=no_content[n], reserved=reserved[n]) for n in names}
+    results['total'] = summarize([v for n in names for v in latencies[n]], elapsed)
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_results(path, kind, params, results):
+    """Write a machine-readable result file and echo it to stdout."""
+    document = {
+        'kind': kind,
+        'commit': _git_commit(),
+        'created': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'params': params,
+        'results': results
+    }
+    text = json.dumps(document, indent=2)
+    if path:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(text + '\n')
+    print(text)
+
+
+def compare(baseline_path, current_path, threshold):
+    """Print per-metric changes between two result files; returns 1 on regression."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)['results']
+    with open(current_path) as f:
+        current = json.load(f)['results']
+
+    regressed = False
+    for name, metrics in current.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms'):
+            if metric not in metrics or not base.get(metric):
+                continue
+            change = metrics[metric] / base[metric] - 1
+            flag = ''
+            if change > threshold:
+                flag = '  REGRESSION'
+                regressed = True
+            print(f"{name:32} {metric:7} {base[metric]:12.4f} -> {metrics[metric]:12.4f} "
+                  f"({change:+.1%}){flag}")
+    return 1 if regressed else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the data annotation API.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    gen = subparsers.add_parser('generate', help='write a synthetic data directory')
+    gen.add_argument('--scale', choices=SCALES, default='1k')
+    gen.add_argument('--data-dir', required=True)
+    gen.add_argument('--storage', choices=['log', 'json'], default='log')
+    gen.add_argument('--seed', type=int, default=0)
+
+    mic = subparsers.add_parser('micro', help='time storage helpers in-process')
+    mic.add_argument('--data-dir', required=True)
+    mic.add_argument('--iterations', type=int, default=200)
+    mic.add_argument('--out')
+
+    lod = subparsers.add_parser('load', help='run a concurrent HTTP load')
+    lod.add_argument('--data-dir', help='serve this data directory from an in-process server')
+    lod.add_argument('--url', help='target an already running server instead')
+    lod.add_argument('--concurrency', type=int, default=8)
+    lod.add_argument('--duration', type=float, default=10.0)
+    lod.add_argument('--users', type=int, default=50)
+    lod.add_argument('--out')
+
+    cmp = subparsers.add_parser('compare', help='compare two result files')
+    cmp.add_argument('baseline')
+    cmp.add_argument('current')
+    cmp.add_argument('--threshold', type=float, default=0.10,
+                     help='relative slowdown reported as a regression')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'generate':
+        generate(args.data_dir, SCALES[args.scale], args.seed, args.storage)
+    elif args.command == 'micro':
+        params = {'data_dir': args.data_dir, 'dataset': _dataset(args.data_dir),
+                  'iterations': args.iterations,
+                  'storage': os.environ.get('RESPONSE_STORAGE', 'log')}
+        write_results(args.out, 'micro', params, micro(args.data_dir, args.iterations))
+    elif args.command == 'load':
+        if not args.url and not args.data_dir:
+            parser.error('load needs --url or --data-dir')
+        server = None
+        url = args.url
+        if url is None:
+            server, url = _start_server(args.data_dir)
+        try:
+            results = load(url, args.concurrency, args.duration, args.users)
+        finally:
+            if server is not None:
+                server.shutdown()
+        params = {'url': args.url, 'data_dir': args.data_dir, 'dataset': _dataset(args.data_dir),
+                  'concurrency': args.concurrency,
+                  'duration': args.duration, 'users': args.users,
+                  'storage': os.environ.get('RESPONSE_STORAGE', 'log')}
+        write_results(args.out, 'load', params, results)
+    else:
+        return compare(args.baseline, args.current, args.threshold)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
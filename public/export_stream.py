@@ -0,0 +1,160 @@
+"""
+Streaming Response Export for Data Annotation Website
+
+This module turns an iterator of stored responses into a filtered stream of
+JSON, NDJSON or CSV chunks, optionally gzip-compressed on the fly. Records
+are serialized one at a time, so memory use does not grow with the number
+of stored responses.
+"""
+
+import io
+import csv
+import json
+import zlib
+
+from stats_engine import DEFAULT_CRITERIA
+
+EXPORT_FORMATS = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+# Plain columns written to CSV exports; ratings get one column per default criterion
+CSV_COLUMNS = ['timestamp', 'user_id', 'domain', 'questionId', 'answerId']
+
+# Flush serialized records to the client once this many bytes are buffered
+CHUNK_SIZE = 64 * 1024
+
+
+def encode_cursor(position):
+    """Encode a storage position as an opaque cursor string."""
+    return '.'.join(str(p) for p in position)
+
+
+def decode_cursor(cursor):
+    """Decode a cursor string back into a storage position."""
+    segment, offset = cursor.split('.')
+    return int(segment), int(offset)
+
+
+class ExportFilter:
+    """Server-side filter over stored responses."""
+
+    def __init__(self, domain=None, user_id=None, question_id=None, since=None, until=None):
+        self.domain = domain
+        self.user_id = user_id
+        self.question_id = question_id
+        self.since = since
+        self.until = until
+
+    @classmethod
+    def from_args(cls, args):
+        """Build a filter from request query arguments."""
+        return cls(
+            domain=args.get('domain') or None,
+            user_id=args.get('user_id') or None,
+            question_id=args.get('questionId') or None,
+            since=args.get('since') or None,
+            until=args.get('until') or None
+        )
+
+    def matches(self, response):
+        if self.domain is not None and response.get('domain') != self.domain:
+            return False
+        if self.user_id is not None and response.get('user_id') != self.user_id:
+            return False
+        if self.question_id is not None and str(response.get('questionId')) != self.question_id:
+            return False
+
+        # ISO-8601 timestamps compare correctly as strings
+        timestamp = response.get('timestamp', '')
+        if self.since is not None and timestamp < self.since:
+            return False
+        if self.until is not None and timestamp >= self.until:
+            return False
+        return True
+
+
+def _csv_row(response):
+    ratings = response.get('ratings') or {}
+    extra = {k: v for k, v in response.items() if k not in CSV_COLUMNS and k != 'ratings'}
+    # Criteria without a column of their own are kept in the extra JSON
+    other_ratings = {k: v for k, v in ratings.items() if k not in DEFAULT_CRITERIA}
+    if other_ratings:
+        extra['ratings'] = other_ratings
+    row = [response.get(c, '') for c in CSV_COLUMNS]
+    row += [ratings.get(c, '') for c in DEFAULT_CRITERIA]
+    row.append(json.dumps(extra) if extra else '')
+    return row
+
+
+def serialize(records, fmt):
+    """Yield text fragments for an iterator of records in the given format."""
+    if fmt == 'json':
+        yield '['
+        first = True
+        for record in records:
+            yield json.dumps(record) if first else ',' + json.dumps(record)
+            first = False
+        yield ']'
+    elif fmt == 'ndjson':
+        for record in records:
+            yield json.dumps(record) + '\n'
+    elif fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(CSV_COLUMNS + [f'ratings.{c}' for c in DEFAULT_CRITERIA] + ['extra'])
+        for record in records:
+            writer.writerow(_csv_row(record))
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+    else:
+        raise ValueError(f"Unknown export format: {fmt}")
+
+
+def chunked(fragments, size=CHUNK_SIZE):
+    """Group small text fragments into encoded chunks of roughly `size` bytes."""
+    parts = []
+    buffered = 0
+    for fragment in fragments:
+        data = fragment.encode('utf-8')
+        parts.append(data)
+        buffered += len(data)
+        if buffered >= size:
+            yield b''.join(parts)
+            parts = []
+            buffered = 0
+    if parts:
+        yield b''.join(parts)
+
+
+def gzip_stream(chunks, level=6):
+    """Compress a stream of byte chunks into a single gzip member."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def collect_page(records, export_filter, position, limit):
+    """Gather up to `limit` matching records and the position to resume from.
+
+    The position is None when the records ran out, i.e. this is the last page.
+    """
+    page = []
+    for record, position in records:
+        if export_filter.matches(record):
+            page.append(record)
+        if len(page) >= limit:
+            break
+    else:
+        return page, None
+    # A full page ending on the last stored record is the last page too
+    if next(records, None) is None:
+        return page, None
+    return page, position
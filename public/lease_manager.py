@@ -0,0 +1,157 @@
+"""
+Question Leases for Data Annotation Website
+
+Handing a question to an annotator reserves it with a lease for a fixed
+time. While the lease is live, the sampler does not hand the same question
+to anyone else. Submitting a response commits the lease and releasing it
+frees the question early; otherwise it expires after its TTL. Callers can
+release every other lease a user holds in a domain, e.g. the questions they
+skipped when they ask for a new one.
+
+Expiry is driven by a min-heap of deadlines that is drained lazily whenever
+leases are touched, so no periodic scan over all leases is needed.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+import uuid
+
+from question_index import domain_key
+
+
+class Lease:
+    """A reservation of one question for one user until a deadline."""
+
+    __slots__ = ('lease_id', 'user_id', 'expires_at')
+
+    def __init__(self, user_id, expires_at):
+        self.lease_id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.expires_at = expires_at
+
+
+class LeaseManager:
+    """Leases keyed by (domain, question id) with heap-based expiry."""
+
+    def __init__(self, ttl=600, clock=time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._leases = {}
+        self._held = {}
+        self._deadlines = []
+        self._sequence = itertools.count()
+        self.granted = 0
+        self.renewed = 0
+        self.committed = 0
+        self.released = 0
+        self.expired = 0
+
+    def _expire_locked(self, now):
+        """Drop leases whose deadline has passed, oldest first."""
+        while self._deadlines and self._deadlines[0][0] <= now:
+            expires_at, _, key, lease_id = heapq.heappop(self._deadlines)
+            lease = self._leases.get(key)
+            # Entries for renewed, committed or released leases are stale
+            if lease is not None and lease.lease_id == lease_id and lease.expires_at == expires_at:
+                self._drop_locked(key, lease)
+                self.expired += 1
+
+    def _drop_locked(self, key, lease):
+        del self._leases[key]
+        held = self._held.get((lease.user_id, key[0]))
+        if held is not None:
+            held.discard(key[1])
+            if not held:
+                del self._held[(lease.user_id, key[0])]
+
+    def _schedule_locked(self, key, lease):
+        heapq.heappush(self._deadlines, (lease.expires_at, next(self._sequence), key, lease.lease_id))
+
+    def acquire(self, domain, question_id, user_id):
+        """Lease a question to a user. Returns the lease, or None if someone else holds it."""
+        key = (domain_key(domain), question_id)
+        with self._lock:
+            now = self.clock()
+            self._expire_locked(now)
+            lease = self._leases.get(key)
+            if lease is not None:
+                if lease.user_id != user_id:
+                    return None
+                lease.expires_at = now + self.ttl
+                self._schedule_locked(key, lease)
+                self.renewed += 1
+                return lease
+
+            lease = Lease(user_id, now + self.ttl)
+            self._leases[key] = lease
+            self._held.setdefault((user_id, key[0]), set()).add(question_id)
+            self._schedule_locked(key, lease)
+            self.granted += 1
+            return lease
+
+    def get(self, domain, question_id):
+        """Return the live lease on a question, if any."""
+        key = (domain_key(domain), question_id)
+        with self._lock:
+            self._expire_locked(self.clock())
+            return self._leases.get(key)
+
+    def _finish(self, domain, question_id, user_id, counter):
+        key = (domain_key(domain), question_id)
+        with self._lock:
+            self._expire_locked(self.clock())
+            lease = self._leases.get(key)
+            if lease is None or lease.user_id != user_id:
+                return False
+            self._drop_locked(key, lease)
+            setattr(self, counter, getattr(self, counter) + 1)
+            return True
+
+    def commit(self, domain, question_id, user_id):
+        """End a user's lease because they submitted a response for the question."""
+        return self._finish(domain, question_id, user_id, 'committed')
+
+    def release(self, domain, question_id, user_id):
+        """Give a leased question back before its lease expires."""
+        return self._finish(domain, question_id, user_id, 'released')
+
+    def release_others(self, domain, user_id, keep):
+        """Release the user's leases in a domain except on `keep`, e.g. questions they skipped.
+
+        Returns the number of leases released.
+        """
+        dkey = domain_key(domain)
+        with self._lock:
+            self._expire_locked(self.clock())
+            stale = [q for q in self._held.get((user_id, dkey), ()) if q not in keep]
+            for question_id in stale:
+                key = (dkey, question_id)
+                self._drop_locked(key, self._leases[key])
+            self.released += len(stale)
+            return len(stale)
+
+    def retry_after(self, domain, question_ids):
+        """Return seconds until the first live lease on one of `question_ids` expires, or None."""
+        dkey = domain_key(domain)
+        with self._lock:
+            now = self.clock()
+            self._expire_locked(now)
+            deadlines = [self._leases[(dkey, q)].expires_at for q in question_ids if (dkey, q) in self._leases]
+            return max(0.0, min(deadlines) - now) if deadlines else None
+
+    def stats(self):
+        """Return lease churn counters and the number of live leases."""
+        with self._lock:
+            self._expire_locked(self.clock())
+            return {
+                'ttl': self.ttl,
+                'active': len(self._leases),
+                'granted': self.granted,
+                'renewed': self.renewed,
+                'committed': self.committed,
+                'released': self.released,
+                'expired': self.expired
+            }
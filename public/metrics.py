@@ -0,0 +1,233 @@
+"""
+Metrics for Data Annotation Website
+
+A small in-process metrics registry rendered in the Prometheus text
+exposition format. It provides counters, gauges and histograms with
+labels, a decorator that times storage helpers, and a sampling profiler
+that can be attached to a single request.
+"""
+
+import os
+import sys
+import time
+import bisect
+import functools
+import threading
+from collections import Counter as _StackCounter
+
+# Latency buckets in seconds, from sub-millisecond dictionary lookups up to full file rewrites
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    pairs += [f'{n}="{_escape(v)}"' for n, v in extra]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=(), collect=None):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        # Optional callable returning [(labels, value), ...] at scrape time
+        self.collect = collect
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(labels.get(n, '') for n in self.label_names)
+
+    def render(self):
+        if self.collect is not None:
+            values = self.collect()
+            with self._lock:
+                self._values = {self._key(labels): v for labels, v in values}
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_value(key, value))
+        return lines
+
+    def _render_value(self, key, value):
+        return [f'{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}']
+
+
+class Counter(_Metric):
+    """Monotonically increasing value, incremented directly or collected at scrape time."""
+
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, set directly or computed at scrape time."""
+
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    """Distribution of observations in cumulative buckets."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _render_value(self, key, value):
+        counts, total, count = value
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += bucket_count
+            labels = _format_labels(self.label_names, key, [('le', _format_value(float(bound)))])
+            lines.append(f'{self.name}_bucket{labels} {cumulative}')
+        labels = _format_labels(self.label_names, key)
+        lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+        lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class Registry:
+    """Ordered collection of metrics rendered together."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs):
+        return self.register(Counter(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs):
+        return self.register(Gauge(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs):
+        return self.register(Histogram(*args, **kwargs))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+request_seconds = registry.histogram(
+    'annotation_http_request_duration_seconds', 'Time spent handling HTTP requests.',
+    ['endpoint', 'method', 'status'])
+storage_seconds = registry.histogram(
+    'annotation_storage_call_duration_seconds', 'Time spent in storage helpers.', ['helper'])
+storage_errors = registry.counter(
+    'annotation_storage_call_errors_total', 'Storage helper calls that raised.', ['helper'])
+bytes_read = registry.counter(
+    'annotation_storage_read_bytes_total', 'Bytes read from data files.', ['file'])
+bytes_written = registry.counter(
+    'annotation_storage_written_bytes_total', 'Bytes written to data files.', ['file'])
+slow_requests = registry.counter(
+    'annotation_slow_requests_total', 'Requests slower than the slow-request threshold.', ['endpoint'])
+
+
+def instrumented(helper):
+    """Decorator recording the latency and failures of a storage helper."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                storage_errors.inc(helper=helper)
+                raise
+            finally:
+                storage_seconds.observe(time.perf_counter() - started, helper=helper)
+        return wrapper
+    return decorator
+
+
+def file_sizes(paths):
+    """Return a gauge collector reporting the size of each existing file in `paths()`."""
+    def collect():
+        sizes = []
+        for path in paths():
+            try:
+                sizes.append(({'file': os.path.basename(path)}, os.path.getsize(path)))
+            except OSError:
+                pass
+        return sizes
+    return collect
+
+
+class SamplingProfiler:
+    """Samples one thread's stack at a fixed interval and counts collapsed stacks."""
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = _StackCounter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}')
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self
+
+    def write_folded(self, path):
+        """Write samples in the collapsed-stack format used by flame graph tools."""
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f'{stack} {count}\n')
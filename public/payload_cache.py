@@ -0,0 +1,119 @@
+"""
+Precompressed Question Payloads for Data Annotation Website
+
+Question payloads carry long answer texts and the same (question, answer)
+pair is handed out many times, so each pair is serialized once and kept
+with precomputed gzip (and, when the `brotli` package is installed,
+brotli) bodies and a stable ETag derived from the serialized JSON.
+
+Entries are keyed by the question index entry signature, so payloads built
+from an older version of a domain file are never served after it changes;
+they simply age out of the LRU.
+"""
+
+import gzip
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+from question_index import domain_key
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+# Content codings in order of preference when the client accepts several equally
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def _compress(encoding, body):
+    if encoding == 'br':
+        return brotli.compress(body, quality=11)
+    # mtime=0 keeps the compressed bytes identical across processes
+    return gzip.compress(body, compresslevel=9, mtime=0)
+
+
+class Payload:
+    """A serialized payload, its precompressed bodies and its ETag."""
+
+    __slots__ = ('body', 'encoded', 'etag')
+
+    def __init__(self, body):
+        self.body = body
+        self.etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+        self.encoded = {}
+        for encoding in ENCODINGS:
+            compressed = _compress(encoding, body)
+            # Tiny payloads can grow when compressed; those are sent as is
+            if len(compressed) < len(body):
+                self.encoded[encoding] = compressed
+
+    def negotiate(self, quality):
+        """Return (encoding, body) for the best coding accepted by `quality(coding)`."""
+        best, best_q = None, quality('identity')
+        for encoding in ENCODINGS:
+            q = quality(encoding)
+            if encoding in self.encoded and q > 0 and q > best_q:
+                best, best_q = encoding, q
+        if best is None:
+            return None, self.body
+        return best, self.encoded[best]
+
+    def size(self):
+        return len(self.body) + sum(len(b) for b in self.encoded.values())
+
+
+class PayloadCache:
+    """LRU of question payloads keyed by (domain, file signature, question, answer)."""
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._payloads = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, domain, entry, question, answer):
+        """Return the Payload for a (question, answer) pair from a question index entry."""
+        key = (domain_key(domain), entry.signature, question.get('id'), answer.get('id'))
+        with self._lock:
+            payload = self._payloads.get(key)
+            if payload is not None:
+                self._payloads.move_to_end(key)
+                self.hits += 1
+                return payload
+            self.misses += 1
+
+        # Serialize and compress outside the lock; a concurrent miss builds the same bytes
+        body = json.dumps({'question': question, 'selected_answer': answer},
+                          separators=(',', ':')).encode('utf-8')
+        payload = Payload(body)
+        with self._lock:
+            previous = self._payloads.get(key)
+            if previous is not None:
+                return previous
+            self._payloads[key] = payload
+            self.bytes += payload.size()
+            while len(self._payloads) > self.max_entries:
+                _, evicted = self._payloads.popitem(last=False)
+                self.bytes -= evicted.size()
+        return payload
+
+    def clear(self):
+        with self._lock:
+            self._payloads.clear()
+            self.bytes = 0
+
+    def stats(self):
+        """Return cache counters and the memory held by cached bodies."""
+        with self._lock:
+            return {
+                'entries': len(self._payloads),
+                'bytes': self.bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'encodings': list(ENCODINGS)
+            }
@@ -0,0 +1,191 @@
+"""
+In-memory Question Index for Data Annotation Website
+
+This module keeps each domain's question file parsed once per process and
+maps question ids to questions. A domain is only re-parsed when the file's
+mtime or size changes on disk, so serving a question costs a stat() and a
+dictionary lookup instead of a full JSON parse.
+
+When a domain file was written by the corpus importer in
+initialize_questions.py, a byte-offset index sits next to it
+(<domain>-questions.idx.json). The index only holds question ids and
+offsets; each question is read and parsed on demand with a single seek.
+"""
+
+import os
+import json
+import threading
+
+
+def domain_key(domain):
+    """Return the normalized key used for a domain in file names and caches."""
+    return domain.lower().replace(' ', '-')
+
+
+def domain_file_name(domain):
+    """Return the question file name used for a domain."""
+    return f"{domain_key(domain)}-questions.json"
+
+
+def offset_index_path(path):
+    """Return the byte-offset index path for a domain question file."""
+    return path[:-len('.json')] + '.idx.json'
+
+
+class _DomainEntry:
+    """Parsed questions for a single domain plus the file signature they came from."""
+
+    __slots__ = ('signature', 'questions', 'by_id', 'ids')
+
+    def __init__(self, signature, questions):
+        self.signature = signature
+        self.questions = questions
+        self.by_id = {q['id']: q for q in questions if 'id' in q}
+        self.ids = list(self.by_id)
+
+    def get(self, question_id):
+        return self.by_id.get(question_id)
+
+
+class _OffsetEntry:
+    """Question ids of a domain with byte offsets into its file; questions load on demand."""
+
+    __slots__ = ('signature', 'path', 'offsets', 'ids', '_questions')
+
+    def __init__(self, signature, path, ids, offsets):
+        self.signature = signature
+        self.path = path
+        self.ids = ids
+        self.offsets = dict(zip(ids, offsets))
+        self._questions = None
+
+    def get(self, question_id):
+        location = self.offsets.get(question_id)
+        if location is None:
+            return None
+        start, length = location
+        with open(self.path, 'rb') as f:
+            f.seek(start)
+            return json.loads(f.read(length))
+
+    @property
+    def questions(self):
+        if self._questions is None:
+            self._questions = [self.get(i) for i in self.ids]
+        return self._questions
+
+
+class QuestionIndex:
+    """Process-level cache of domain questions with mtime/size based invalidation."""
+
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+
+    def path_for(self, domain):
+        """Return the path of the question file for a domain."""
+        return os.path.join(self.data_dir, domain_file_name(domain))
+
+    def _signature(self, path):
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+
+    def _load(self, path, signature):
+        """Build an entry from the offset index when it matches the file, else parse it."""
+        try:
+            with open(offset_index_path(path), 'r') as f:
+                index = json.load(f)
+            if (index['file_mtime_ns'], index['file_size']) == signature:
+                return _OffsetEntry(signature, path, index['ids'], index['offsets'])
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            pass
+
+        with open(path, 'r') as f:
+            return _DomainEntry(signature, json.load(f)['questions'])
+
+    def entry(self, domain):
+        """Return an up-to-date entry for a domain, parsing the file if needed.
+
+        Entries expose `ids` (question ids in file order) and `get(id)`.
+        """
+        path = self.path_for(domain)
+        key = domain_file_name(domain)
+        signature = self._signature(path)
+
+        entry = self._entries.get(key)
+        if entry is not None and entry.signature == signature:
+            self.hits += 1
+            return entry
+
+        with self._lock:
+            # Another thread may have reloaded while we waited for the lock
+            entry = self._entries.get(key)
+            if entry is not None and entry.signature == signature:
+                self.hits += 1
+                return entry
+
+            new_entry = self._load(path, signature)
+
+            if entry is None:
+                self.misses += 1
+            else:
+                self.reloads += 1
+
+            entry = new_entry
+            self._entries[key] = entry
+            return entry
+
+    def get_questions(self, domain):
+        """Return the list of questions for a domain."""
+        return self.entry(domain).questions
+
+    def get_question(self, domain, question_id):
+        """Return a single question by id, or None if it does not exist."""
+        return self.entry(domain).get(question_id)
+
+    def warm(self, domains=None):
+        """Parse question files up front; defaults to every *-questions.json in data_dir."""
+        if domains is None:
+            try:
+                names = os.listdir(self.data_dir)
+            except FileNotFoundError:
+                names = []
+            domains = [n[:-len('-questions.json')] for n in sorted(names)
+                       if n.endswith('-questions.json')]
+
+        loaded = []
+        for domain in domains:
+            try:
+                self.entry(domain)
+                loaded.append(domain)
+            except (FileNotFoundError, json.JSONDecodeError, KeyError) as e:
+                print(f"Error warming question index for {domain}: {e}")
+        return loaded
+
+    def invalidate(self, domain=None):
+        """Drop cached questions for one domain, or for all domains."""
+        with self._lock:
+            if domain is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(domain_file_name(domain), None)
+
+    def stats(self):
+        """Return cache counters and the number of questions held per domain."""
+        # entry() inserts under the lock, so take a consistent snapshot under it too
+        with self._lock:
+            entries = list(self._entries.items())
+            hits, misses, reloads = self.hits, self.misses, self.reloads
+        return {
+            'hits': hits,
+            'misses': misses,
+            'reloads': reloads,
+            'domains': {
+                key[:-len('-questions.json')]: len(entry.ids)
+                for key, entry in entries
+            }
+        }
@@ -0,0 +1,372 @@
+"""
+Question Sampler for Data Annotation Website
+
+This module decides which question and answer a user is shown next. Each
+user keeps a pool of unreviewed question ids per domain that supports O(1)
+random draws and removals, so serving a question no longer scans every
+question against the user's reviewed list. Pools also bucket their ids by
+annotation count, so the least-annotated draw takes the lowest non-empty
+bucket instead of scanning the domain.
+
+Assignment strategies are pluggable:
+  - "random":          uniform draw from the user's unreviewed pool
+  - "least-annotated": prefer the questions, and the answers within them,
+                       that have received the fewest annotations so far
+
+Every strategy draws from a single random.Random, so results are
+reproducible when the sampler is given a seed.
+
+When a near-duplicate cluster map is loaded (see near_duplicates.py), a
+cluster counts as one item: once a user has reviewed any member, the other
+members are dropped from that user's pools in every domain.
+"""
+
+import bisect
+import random
+import threading
+from collections import defaultdict
+
+from question_index import domain_key
+
+
+class IndexedSet:
+    """Set with O(1) add, remove and uniform random choice, iterated in insertion order."""
+
+    __slots__ = ('_items', '_positions')
+
+    def __init__(self, items=()):
+        self._items = []
+        self._positions = {}
+        for item in items:
+            self.add(item)
+
+    def add(self, item):
+        if item not in self._positions:
+            self._positions[item] = len(self._items)
+            self._items.append(item)
+
+    def discard(self, item):
+        position = self._positions.pop(item, None)
+        if position is None:
+            return
+        last = self._items.pop()
+        if position < len(self._items):
+            self._items[position] = last
+            self._positions[last] = position
+
+    def choice(self, rng):
+        return self._items[rng.randrange(len(self._items))]
+
+    def __contains__(self, item):
+        return item in self._positions
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+
+class QuestionsClaimed(Exception):
+    """Raised when a user has unreviewed questions left but every one was refused by `claim`."""
+
+    def __init__(self, question_ids):
+        super().__init__(f"{len(question_ids)} unreviewed questions are claimed by other users")
+        self.question_ids = question_ids
+
+
+class _DomainState:
+    """Questions of one domain and how many annotations each has."""
+
+    def __init__(self, source, counts):
+        self.source = source
+        self.levels = {question_id: counts.get(question_id, 0) for question_id in source.ids}
+
+    def increment(self, question_id):
+        if question_id in self.levels:
+            self.levels[question_id] += 1
+
+
+class UnreviewedPool:
+    """A user's unreviewed ids in one domain, also bucketed by annotation count.
+
+    Ids are filed under the count they had when added. Counts only grow, so
+    an id drawn from a bucket below its current count is refiled and the
+    draw retried; each annotation moves an id at most once per pool.
+    """
+
+    __slots__ = ('_ids', '_levels', '_filed', '_buckets', '_sorted_levels')
+
+    def __init__(self, ids, levels):
+        self._ids = IndexedSet()
+        # Shared with the domain state, which keeps it current
+        self._levels = levels
+        self._filed = {}
+        self._buckets = {}
+        self._sorted_levels = []
+        for question_id in ids:
+            self.add(question_id)
+
+    def _file(self, question_id, level):
+        bucket = self._buckets.get(level)
+        if bucket is None:
+            bucket = self._buckets[level] = IndexedSet()
+            bisect.insort(self._sorted_levels, level)
+        bucket.add(question_id)
+        self._filed[question_id] = level
+
+    def _unfile(self, question_id):
+        level = self._filed.pop(question_id)
+        bucket = self._buckets[level]
+        bucket.discard(question_id)
+        if not bucket:
+            del self._buckets[level]
+            del self._sorted_levels[bisect.bisect_left(self._sorted_levels, level)]
+
+    def add(self, question_id):
+        if question_id not in self._ids:
+            self._ids.add(question_id)
+            self._file(question_id, self._levels.get(question_id, 0))
+
+    def discard(self, question_id):
+        if question_id in self._ids:
+            self._ids.discard(question_id)
+            self._unfile(question_id)
+
+    def choice(self, rng):
+        return self._ids.choice(rng)
+
+    def least_annotated(self, rng):
+        """Return a random id among those with the fewest annotations."""
+        while True:
+            level = self._sorted_levels[0]
+            question_id = self._buckets[level].choice(rng)
+            current = self._levels.get(question_id, 0)
+            if current == level:
+                return question_id
+            self._unfile(question_id)
+            self._file(question_id, current)
+
+    def __contains__(self, question_id):
+        return question_id in self._ids
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __iter__(self):
+        return iter(self._ids)
+
+
+class SamplingStrategy:
+    """Base class for question and answer assignment strategies."""
+
+    def choose_question(self, state, pool, rng):
+        """Return an id from `pool` (a non-empty UnreviewedPool)."""
+        raise NotImplementedError
+
+    def choose_answer(self, answers, answer_counts, rng):
+        """Return one of `answers` given per-answer annotation counts."""
+        raise NotImplementedError
+
+
+class RandomStrategy(SamplingStrategy):
+    """Uniform random question and answer."""
+
+    def choose_question(self, state, pool, rng):
+        return pool.choice(rng)
+
+    def choose_answer(self, answers, answer_counts, rng):
+        return answers[rng.randrange(len(answers))]
+
+
+class LeastAnnotatedStrategy(SamplingStrategy):
+    """Prefer the questions and answers with the fewest annotations."""
+
+    def choose_question(self, state, pool, rng):
+        return pool.least_annotated(rng)
+
+    def choose_answer(self, answers, answer_counts, rng):
+        fewest = min(answer_counts.get(a.get('id'), 0) for a in answers)
+        candidates = [a for a in answers if answer_counts.get(a.get('id'), 0) == fewest]
+        return candidates[rng.randrange(len(candidates))]
+
+
+STRATEGIES = {
+    'random': RandomStrategy,
+    'least-annotated': LeastAnnotatedStrategy,
+}
+
+
+def register_strategy(name, strategy_class):
+    """Make a SamplingStrategy subclass available by name."""
+    STRATEGIES[name] = strategy_class
+
+
+class QuestionSampler:
+    """Per-user unreviewed pools plus annotation counts driving a sampling strategy."""
+
+    def __init__(self, strategy='random', seed=None):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown sampling strategy: {strategy}")
+        self.strategy = STRATEGIES[strategy]()
+        self.rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+        self.reviewed = defaultdict(set)
+        self.reviewed_keys = defaultdict(set)
+        self.reviewed_clusters = defaultdict(set)
+        self.cluster_of = {}
+        self.cluster_members = {}
+        self.pools = defaultdict(dict)
+        self.domains = {}
+        self.question_counts = defaultdict(lambda: defaultdict(int))
+        self.answer_counts = defaultdict(lambda: defaultdict(int))
+
+    def load_reviewed(self, reviewed):
+        """Seed reviewed sets from a {user_id: {domain: [question_id, ...]}} mapping.
+
+        A plain list of question ids per user is accepted for files written
+        before domains were recorded; those ids never match a cluster.
+        """
+        with self._lock:
+            self.reviewed.clear()
+            self.reviewed_keys.clear()
+            self.pools.clear()
+            for user_id, domains in reviewed.items():
+                if isinstance(domains, list):
+                    domains = {'': domains}
+                for domain, question_ids in domains.items():
+                    self.reviewed[user_id].update(question_ids)
+                    if domain:
+                        key = domain_key(domain)
+                        self.reviewed_keys[user_id].update((key, q) for q in question_ids)
+            self._rebuild_reviewed_clusters()
+
+    def load_clusters(self, clusters):
+        """Load near-duplicate clusters, each a list of (domain, question_id) members."""
+        with self._lock:
+            self.cluster_of.clear()
+            self.cluster_members.clear()
+            for cluster_id, members in enumerate(clusters):
+                members = [(domain_key(domain), question_id) for domain, question_id in members]
+                self.cluster_members[cluster_id] = members
+                for member in members:
+                    self.cluster_of[member] = cluster_id
+            self.pools.clear()
+            self._rebuild_reviewed_clusters()
+
+    def _rebuild_reviewed_clusters(self):
+        self.reviewed_clusters.clear()
+        for user_id, keys in self.reviewed_keys.items():
+            for key in keys:
+                cluster_id = self.cluster_of.get(key)
+                if cluster_id is not None:
+                    self.reviewed_clusters[user_id].add(cluster_id)
+
+    def record_annotation(self, response):
+        """Count a stored response towards its question's and answer's annotations."""
+        if 'questionId' not in response:
+            return
+        key = domain_key(response.get('domain', 'unknown'))
+        question_id = response['questionId']
+        with self._lock:
+            self.question_counts[key][question_id] += 1
+            if 'answerId' in response:
+                self.answer_counts[(key, question_id)][response['answerId']] += 1
+            state = self.domains.get(key)
+            if state is not None:
+                state.increment(question_id)
+
+    def mark_reviewed(self, user_id, question_id, domain):
+        """Remove a question, and its near-duplicates, from every pool the user has."""
+        key = domain_key(domain)
+        with self._lock:
+            self.reviewed[user_id].add(question_id)
+            self.reviewed_keys[user_id].add((key, question_id))
+            cluster_id = self.cluster_of.get((key, question_id))
+            clusters = () if cluster_id is None else (cluster_id,)
+            self.reviewed_clusters[user_id].update(clusters)
+            for key, (_, pool) in self.pools[user_id].items():
+                pool.discard(question_id)
+                for cluster_id in clusters:
+                    for member_key, member_id in self.cluster_members[cluster_id]:
+                        if member_key == key:
+                            pool.discard(member_id)
+
+    def reviewed_sizes(self):
+        """Return the number of users with reviewed questions and the total reviewed count."""
+        with self._lock:
+            return len(self.reviewed), sum(len(q) for q in self.reviewed.values())
+
+    def _domain_state(self, key, source):
+        state = self.domains.get(key)
+        if state is None or state.source is not source:
+            state = _DomainState(source, self.question_counts[key])
+            self.domains[key] = state
+        return state
+
+    def _pool(self, user_id, key, state):
+        entry = self.pools[user_id].get(key)
+        if entry is None or entry[0] is not state.source:
+            reviewed = self.reviewed.get(user_id, ())
+            clusters = self.reviewed_clusters.get(user_id, ())
+            pool = UnreviewedPool((q for q in state.source.ids
+                                   if q not in reviewed and self.cluster_of.get((key, q)) not in clusters),
+                                  state.levels)
+            entry = (state.source, pool)
+            self.pools[user_id][key] = entry
+        return entry[1]
+
+    def sample(self, domain, user_id, source, claim=None):
+        """Return (question, answer) for a user, or None if nothing is left to review.
+
+        `source` is a question index entry exposing `ids` and `get(id)`.
+        `answer` is None when the chosen question has no answers. Raises
+        QuestionsClaimed when questions are left but `claim` refused them all.
+        """
+        selected = self.sample_many(domain, user_id, source, 1, claim)
+        return selected[0] if selected else None
+
+    def sample_many(self, domain, user_id, source, n, claim=None):
+        """Return up to `n` (question, answer) pairs for distinct unreviewed questions.
+
+        When given, `claim(question_id)` is called for each candidate while the
+        sampler is locked; candidates it rejects (e.g. leased to another user)
+        are skipped. If it rejects every candidate, QuestionsClaimed is raised
+        so callers can tell "reserved for now" from "nothing left".
+        """
+        key = domain_key(domain)
+        with self._lock:
+            state = self._domain_state(key, source)
+            pool = self._pool(user_id, key, state)
+            question_ids = []
+            drawn = []
+            while pool and len(question_ids) < n:
+                question_id = self.strategy.choose_question(state, pool, self.rng)
+                pool.discard(question_id)
+                drawn.append(question_id)
+                if claim is None or claim(question_id):
+                    question_ids.append(question_id)
+            # Nothing is reviewed until a response is submitted
+            for question_id in drawn:
+                pool.add(question_id)
+        if drawn and not question_ids:
+            raise QuestionsClaimed(drawn)
+
+        selected = []
+        for question_id in question_ids:
+            question = source.get(question_id)
+            answers = question.get('answers')
+            if not answers:
+                selected.append((question, None))
+                continue
+            with self._lock:
+                counts = self.answer_counts.get((key, question_id), {})
+                selected.append((question, self.strategy.choose_answer(answers, counts, self.rng)))
+        return selected
+
+    def remaining(self, domain, user_id, source):
+        """Return how many questions in a domain the user has not reviewed."""
+        key = domain_key(domain)
+        with self._lock:
+            return len(self._pool(user_id, key, self._domain_state(key, source)))
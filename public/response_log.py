@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Append-only Response Log for Data Annotation Website
+
+Responses are stored one JSON record per line in responses.jsonl. Saving a
+response appends a single line instead of rewriting every stored response,
+so the cost of a submission does not grow with the size of the dataset.
+
+Durability is controlled by the fsync policy:
+  - "always": fsync after every append, one append at a time
+  - "batch":  group commit; an append returns only once an fsync covering
+              its records has finished, but concurrent appends share one
+              fsync. The writer that runs it may first wait up to
+              `batch_interval` seconds for `batch_size` records to gather.
+  - "never":  leave flushing to the operating system
+
+On open, a torn final line left behind by a crash is truncated. Rotated
+segments (responses.jsonl.1, responses.jsonl.2, ...) are read before the
+active file, and can be merged back with the offline `compact` command.
+
+Usage:
+    python response_log.py migrate   # one-shot import of responses.json
+    python response_log.py compact   # merge segments, drop corrupt lines
+    python response_log.py rotate    # start a new active segment
+    python response_log.py recover   # truncate a torn final line
+"""
+
+import os
+import sys
+import json
+import time
+import atexit
+import argparse
+import threading
+
+FSYNC_POLICIES = ('always', 'batch', 'never')
+
+
+def _dumps(record):
+    return json.dumps(record, separators=(',', ':'), ensure_ascii=False)
+
+
+def _fsync_dir(path):
+    """Make a rename or file creation in `path`'s directory durable."""
+    try:
+        fd = os.open(os.path.dirname(path) or '.', os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def recover_log(path):
+    """Truncate a partially written final line. Returns the number of bytes removed."""
+    try:
+        size = os.path.getsize(path)
+    except FileNotFoundError:
+        return 0
+    if size == 0:
+        return 0
+
+    with open(path, 'rb+') as f:
+        f.seek(size - 1)
+        if f.read(1) == b'\n':
+            return 0
+
+        # Walk backwards until the last complete line's newline
+        pos = size
+        chunk = 4096
+        keep = 0
+        while pos > 0:
+            start = max(0, pos - chunk)
+            f.seek(start)
+            block = f.read(pos - start)
+            idx = block.rfind(b'\n')
+            if idx != -1:
+                keep = start + idx + 1
+                break
+            pos = start
+
+        f.truncate(keep)
+        f.flush()
+        os.fsync(f.fileno())
+    print(f"Recovered response log {path}: removed {size - keep} bytes of torn record")
+    return size - keep
+
+
+class ResponseLog:
+    """Append-only JSONL log of annotation responses with group commit."""
+
+    def __init__(self, path, fsync='batch', batch_size=32, batch_interval=0.0):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync}")
+        self.path = path
+        self.fsync = fsync
+        self.batch_size = max(1, int(batch_size))
+        self.batch_interval = float(batch_interval)
+
+        self._lock = threading.Lock()
+        self._synced_cond = threading.Condition(self._lock)
+        self._file = None
+        # Records written so far and how many of them an fsync has covered
+        self._written = 0
+        self._synced = 0
+        self._syncing = False
+
+        recover_log(self.path)
+        self._open()
+        atexit.register(self.close)
+
+    def _open(self):
+        existed = os.path.exists(self.path)
+        self._file = open(self.path, 'ab')
+        if not existed:
+            _fsync_dir(self.path)
+
+    def _sync_locked(self):
+        # Never fsync a file another writer is about to close
+        while self._syncing:
+            self._synced_cond.wait()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._synced = self._written
+        self._synced_cond.notify_all()
+
+    def _group_commit_locked(self, target):
+        """Wait until records up to `target` are durable, running the shared fsync if none is."""
+        while self._synced < target:
+            if self._syncing:
+                self._synced_cond.wait()
+                continue
+
+            # This writer leads the next fsync; give others a moment to join it
+            self._syncing = True
+            deadline = time.monotonic() + self.batch_interval
+            while self._written - self._synced < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._synced_cond.wait(remaining)
+            covered = self._written
+            fd = self._file.fileno()
+            self._lock.release()
+            try:
+                os.fsync(fd)
+            finally:
+                self._lock.acquire()
+                self._syncing = False
+                self._synced_cond.notify_all()
+            self._synced = max(self._synced, covered)
+
+    def _after_write_locked(self, count):
+        self._file.flush()
+        self._written += count
+        if self.fsync == 'always':
+            self._sync_locked()
+        elif self.fsync == 'batch':
+            # Wake a leader waiting for the batch to fill
+            self._synced_cond.notify_all()
+            self._group_commit_locked(self._written)
+
+    def append(self, record):
+        """Append a single record to the log."""
+        self.append_many([record])
+
+    def append_many(self, records):
+        """Append several records with a single write. Returns the number of bytes written."""
+        if not records:
+            return 0
+        data = ''.join(_dumps(r) + '\n' for r in records).encode('utf-8')
+        with self._lock:
+            self._file.write(data)
+            self._after_write_locked(len(records))
+        return len(data)
+
+    def sync(self):
+        """Force any buffered records to disk."""
+        with self._lock:
+            if self._file is not None and not self._file.closed:
+                self._sync_locked()
+
+    def close(self):
+        """Sync and close the active segment."""
+        with self._lock:
+            if self._file is not None and not self._file.closed:
+                self._sync_locked()
+                self._file.close()
+
+    def segments(self):
+        """Return rotated segment paths followed by the active log, oldest first."""
+        return list_segments(self.path) + [self.path]
+
+    def __iter__(self):
+        return iter_records(self.path)
+
+    def rotate(self):
+        """Close the active file, rename it to the next segment and start a new one."""
+        with self._lock:
+            self._sync_locked()
+            self._file.close()
+            segment = rotate_log(self.path)
+            self._file = open(self.path, 'ab')
+            _fsync_dir(self.path)
+            return segment
+
+
+def list_segments(path):
+    """Return rotated segments for a log, ordered oldest to newest."""
+    directory = os.path.dirname(path) or '.'
+    prefix = os.path.basename(path) + '.'
+    numbered = []
+    for name in os.listdir(directory):
+        if name.startswith(prefix) and name[len(prefix):].isdigit():
+            numbered.append((int(name[len(prefix):]), os.path.join(directory, name)))
+    return [p for _, p in sorted(numbered)]
+
+
+def iter_records(path):
+    """Yield every record across rotated segments and the active log."""
+    for record, _ in iter_records_from(path):
+        yield record
+
+
+def iter_records_from(path, position=(0, 0)):
+    """Yield (record, position) pairs starting at a (segment, byte offset) position.
+
+    The position yielded with each record points just past it, so it can be
+    used to resume reading later. Positions stay valid across rotation but
+    not across compaction.
+    """
+    segments = list_segments(path) + [path]
+    start_segment, start_offset = position
+    for index in range(start_segment, len(segments)):
+        segment = segments[index]
+        try:
+            f = open(segment, 'rb')
+        except FileNotFoundError:
+            continue
+        with f:
+            offset = start_offset if index == start_segment else 0
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    # Torn record still being written or left by a crash
+                    break
+                offset += len(line)
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line), (index, offset)
+                except json.JSONDecodeError as e:
+                    print(f"Skipping corrupt record in {segment}: {e}")
+
+
+def rotate_log(path):
+    """Rename the active log to the next numbered segment."""
+    segments = list_segments(path)
+    next_number = int(segments[-1].rsplit('.', 1)[1]) + 1 if segments else 1
+    segment = f"{path}.{next_number}"
+    if os.path.exists(path):
+        os.replace(path, segment)
+        _fsync_dir(path)
+    return segment
+
+
+def compact_log(path):
+    """Merge all segments into a single active log, dropping corrupt lines."""
+    tmp_path = path + '.compact'
+    count = 0
+    with open(tmp_path, 'wb') as out:
+        for record in iter_records(path):
+            out.write((_dumps(record) + '\n').encode('utf-8'))
+            count += 1
+        out.flush()
+        os.fsync(out.fileno())
+
+    segments = list_segments(path)
+    os.replace(tmp_path, path)
+    for segment in segments:
+        os.remove(segment)
+    _fsync_dir(path)
+    return count
+
+
+def migrate_json(json_path, log_path):
+    """Import records from a legacy responses.json array into the log."""
+    try:
+        with open(json_path, 'r') as f:
+            responses = json.load(f)
+    except FileNotFoundError:
+        return 0
+
+    tmp_path = log_path + '.migrate'
+    with open(tmp_path, 'wb') as out:
+        for record in iter_records(log_path):
+            out.write((_dumps(record) + '\n').encode('utf-8'))
+        for record in responses:
+            out.write((_dumps(record) + '\n').encode('utf-8'))
+        out.flush()
+        os.fsync(out.fileno())
+
+    for segment in list_segments(log_path):
+        os.remove(segment)
+    os.replace(tmp_path, log_path)
+    os.replace(json_path, json_path + '.migrated')
+    _fsync_dir(log_path)
+    return len(responses)
+
+
+def main(argv=None):
+    data_dir = os.path.join(os.path.dirname(__file__), 'data')
+    parser = argparse.ArgumentParser(description='Maintain the append-only response log.')
+    parser.add_argument('command', choices=['migrate', 'compact', 'rotate', 'recover'])
+    parser.add_argument('--log', default=os.path.join(data_dir, 'responses.jsonl'),
+                        help='path of the active response log')
+    parser.add_argument('--json', default=os.path.join(data_dir, 'responses.json'),
+                        help='legacy responses.json to migrate from')
+    args = parser.parse_args(argv)
+
+    if args.command == 'migrate':
+        count = migrate_json(args.json, args.log)
+        print(f"Migrated {count} responses into {args.log}")
+    elif args.command == 'compact':
+        recover_log(args.log)
+        count = compact_log(args.log)
+        print(f"Compacted {count} responses into {args.log}")
+    elif args.command == 'rotate':
+        recover_log(args.log)
+        print(f"Rotated {args.log} to {rotate_log(args.log)}")
+    elif args.command == 'recover':
+        removed = recover_log(args.log)
+        print(f"Removed {removed} bytes from {args.log}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,144 @@
+"""
+Incremental Statistics Engine for Data Annotation Website
+
+This module keeps running aggregates of submitted responses so annotation
+statistics can be answered without re-reading stored responses. Aggregates
+are rebuilt from storage once at startup and then updated on every
+submission.
+"""
+
+import threading
+from collections import defaultdict
+
+# Criteria always reported, even before any response carries them
+DEFAULT_CRITERIA = ['reasoning', 'accuracy', 'domainKnowledge', 'creativity', 'difficulty']
+
+# Length of the timestamp prefix that identifies a throughput bucket
+BUCKET_PREFIX = {
+    'minute': len('2000-01-01T00:00'),
+    'hour': len('2000-01-01T00'),
+    'day': len('2000-01-01'),
+}
+
+
+class _Moments:
+    """Count, sum and sum of squares of a stream of numbers."""
+
+    __slots__ = ('count', 'total', 'total_sq')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.total_sq += value * value
+
+    def mean(self):
+        return self.total / self.count if self.count else 0
+
+    def variance(self):
+        if not self.count:
+            return 0
+        mean = self.total / self.count
+        return max(0.0, self.total_sq / self.count - mean * mean)
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'average': round(self.mean(), 2),
+            'variance': round(self.variance(), 4)
+        }
+
+
+class StatsEngine:
+    """Running aggregates over every stored response."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Drop all aggregates."""
+        self.total = 0
+        self.domains = defaultdict(int)
+        self.criteria = defaultdict(_Moments)
+        self.domain_criteria = defaultdict(lambda: defaultdict(_Moments))
+        self.questions = defaultdict(int)
+        self.annotators = defaultdict(int)
+        self.buckets = defaultdict(int)
+
+    def rebuild(self, responses):
+        """Recompute aggregates from an iterable of stored responses."""
+        with self._lock:
+            self.reset()
+            for response in responses:
+                self._record_locked(response)
+
+    def record(self, response):
+        """Fold a single newly stored response into the aggregates."""
+        with self._lock:
+            self._record_locked(response)
+
+    def _record_locked(self, response):
+        self.total += 1
+        domain = response.get('domain', 'unknown')
+        self.domains[domain] += 1
+
+        if 'questionId' in response:
+            self.questions[f"{domain}/{response['questionId']}"] += 1
+        if 'user_id' in response:
+            self.annotators[response['user_id']] += 1
+
+        timestamp = response.get('timestamp')
+        if isinstance(timestamp, str) and len(timestamp) >= BUCKET_PREFIX['minute']:
+            self.buckets[timestamp[:BUCKET_PREFIX['minute']]] += 1
+
+        ratings = response.get('ratings')
+        if isinstance(ratings, dict):
+            for criterion, value in ratings.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                self.criteria[criterion].add(value)
+                self.domain_criteria[domain][criterion].add(value)
+
+    def throughput(self, bucket='hour'):
+        """Return response counts per time bucket ('minute', 'hour' or 'day')."""
+        prefix = BUCKET_PREFIX[bucket]
+        with self._lock:
+            counts = defaultdict(int)
+            for key, count in self.buckets.items():
+                counts[key[:prefix]] += count
+        return dict(sorted(counts.items()))
+
+    def snapshot(self, breakdowns=(), bucket='hour'):
+        """Return the statistics payload served by /api/stats."""
+        with self._lock:
+            criteria = {c: self.criteria[c] if c in self.criteria else _Moments()
+                        for c in DEFAULT_CRITERIA}
+            criteria.update(self.criteria)
+
+            stats = {
+                'total_responses': self.total,
+                'domains': dict(self.domains),
+                'criteria_averages': {c: round(m.mean(), 2) for c, m in criteria.items()},
+                'criteria': {c: m.summary() for c, m in criteria.items()},
+                'questions_annotated': len(self.questions),
+                'annotators': len(self.annotators)
+            }
+
+            if 'domains' in breakdowns:
+                stats['domain_averages'] = {
+                    domain: {c: m.summary() for c, m in moments.items()}
+                    for domain, moments in self.domain_criteria.items()
+                }
+            if 'questions' in breakdowns:
+                stats['question_counts'] = dict(self.questions)
+            if 'annotators' in breakdowns:
+                stats['annotator_counts'] = dict(self.annotators)
+
+        if 'throughput' in breakdowns:
+            stats['throughput'] = self.throughput(bucket)
+        return stats
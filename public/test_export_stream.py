@@ -0,0 +1,50 @@
+"""Tests for the streaming response export."""
+
+import csv
+import gzip
+import io
+import json
+
+from export_stream import ExportFilter, chunked, collect_page, gzip_stream, serialize
+from stats_engine import DEFAULT_CRITERIA
+
+
+def positioned(records):
+    return iter([(record, (0, index + 1)) for index, record in enumerate(records)])
+
+
+def test_collect_page_gives_a_cursor_only_when_records_remain():
+    records = [{'n': n} for n in range(5)]
+
+    page, position = collect_page(positioned(records), ExportFilter(), (0, 0), 2)
+    assert [r['n'] for r in page] == [0, 1] and position == (0, 2)
+
+    # A full page ending on the last record is the last page
+    page, position = collect_page(positioned(records[3:]), ExportFilter(), (0, 0), 2)
+    assert [r['n'] for r in page] == [3, 4] and position is None
+
+    page, position = collect_page(positioned(records[4:]), ExportFilter(), (0, 0), 2)
+    assert [r['n'] for r in page] == [4] and position is None
+
+
+def test_collect_page_skips_records_outside_the_filter():
+    records = [{'user_id': u} for u in 'abab']
+
+    page, position = collect_page(positioned(records), ExportFilter(user_id='b'), (0, 0), 1)
+    assert page == [{'user_id': 'b'}] and position == (0, 2)
+
+
+def test_csv_keeps_ratings_without_a_column_in_extra():
+    record = {'user_id': 'u', 'ratings': {DEFAULT_CRITERIA[0]: 4, 'overall': 3}, 'idempotencyKey': 'k'}
+    header, row = csv.reader(io.StringIO(''.join(serialize(iter([record]), 'csv'))))
+
+    values = dict(zip(header, row))
+    assert values[f'ratings.{DEFAULT_CRITERIA[0]}'] == '4'
+    assert json.loads(values['extra']) == {'idempotencyKey': 'k', 'ratings': {'overall': 3}}
+
+
+def test_gzip_stream_round_trips_json():
+    records = [{'n': n} for n in range(1000)]
+    body = b''.join(gzip_stream(chunked(serialize(iter(records), 'json'), size=256)))
+
+    assert json.loads(gzip.decompress(body)) == records
@@ -0,0 +1,84 @@
+"""Tests for question leases."""
+
+from lease_manager import LeaseManager
+
+
+class Clock:
+    """Manually advanced stand-in for time.monotonic."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_leases_expire_in_deadline_order():
+    clock = Clock()
+    leases = LeaseManager(ttl=10, clock=clock)
+    leases.acquire('d', 'q0', 'u')
+    clock.now = 5
+    leases.acquire('d', 'q1', 'v')
+
+    clock.now = 10
+    assert leases.get('d', 'q0') is None
+    assert leases.get('d', 'q1').user_id == 'v'
+    assert leases.acquire('d', 'q0', 'v') is not None
+    clock.now = 15
+    assert leases.get('d', 'q1') is None
+    assert leases.stats()['expired'] == 2
+
+
+def test_renewal_leaves_a_stale_heap_entry_that_does_not_expire_the_lease():
+    clock = Clock()
+    leases = LeaseManager(ttl=10, clock=clock)
+    first = leases.acquire('d', 'q0', 'u')
+    clock.now = 8
+    assert leases.acquire('d', 'q0', 'u') is first
+    assert leases.acquire('d', 'q0', 'v') is None
+
+    # The entry scheduled at 10 is stale; the renewed lease lives until 18
+    clock.now = 12
+    assert leases.get('d', 'q0') is first
+    clock.now = 18
+    assert leases.get('d', 'q0') is None
+    stats = leases.stats()
+    assert (stats['renewed'], stats['expired'], stats['active']) == (1, 1, 0)
+
+
+def test_committed_lease_is_not_expired_later():
+    clock = Clock()
+    leases = LeaseManager(ttl=10, clock=clock)
+    leases.acquire('d', 'q0', 'u')
+    assert not leases.commit('d', 'q0', 'v')
+    assert leases.commit('d', 'q0', 'u')
+
+    clock.now = 20
+    assert leases.stats()['expired'] == 0
+
+
+def test_release_others_keeps_only_the_given_questions_of_that_user_and_domain():
+    leases = LeaseManager(ttl=10, clock=Clock())
+    for question_id in ('q0', 'q1', 'q2'):
+        leases.acquire('d', question_id, 'u')
+    leases.acquire('e', 'q0', 'u')
+    leases.acquire('d', 'q3', 'v')
+
+    assert leases.release_others('d', 'u', {'q1'}) == 2
+    assert leases.get('d', 'q0') is None and leases.get('d', 'q2') is None
+    assert leases.get('d', 'q1').user_id == 'u'
+    assert leases.get('e', 'q0').user_id == 'u'
+    assert leases.get('d', 'q3').user_id == 'v'
+    # Released questions can be leased to someone else straight away
+    assert leases.acquire('d', 'q0', 'v') is not None
+
+
+def test_retry_after_reports_the_earliest_deadline():
+    clock = Clock()
+    leases = LeaseManager(ttl=10, clock=clock)
+    leases.acquire('d', 'q0', 'u')
+    clock.now = 4
+    leases.acquire('d', 'q1', 'u')
+
+    assert leases.retry_after('d', ['q1', 'q0']) == 6
+    assert leases.retry_after('d', ['q2']) is None
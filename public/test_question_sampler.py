@@ -0,0 +1,118 @@
+"""Tests for the question sampler."""
+
+import pytest
+
+from question_sampler import IndexedSet, QuestionSampler, QuestionsClaimed
+
+
+class Source:
+    """Minimal stand-in for a question index entry."""
+
+    def __init__(self, prefix, count, answers=2):
+        self.questions = [
+            {'id': f'{prefix}{i}', 'answers': [{'id': f'{prefix}{i}-a{n}'} for n in range(answers)]}
+            for i in range(count)
+        ]
+        self.by_id = {q['id']: q for q in self.questions}
+        self.ids = [q['id'] for q in self.questions]
+
+    def get(self, question_id):
+        return self.by_id[question_id]
+
+
+def draws(sampler, source, user_id='u', n=30):
+    return [(q['id'], a['id']) for q, a in sampler.sample_many('d', user_id, source, n)]
+
+
+@pytest.mark.parametrize('strategy', ['random', 'least-annotated'])
+def test_seeded_samplers_are_deterministic(strategy):
+    source = Source('q', 200)
+    first = QuestionSampler(strategy, seed=7)
+    second = QuestionSampler(strategy, seed=7)
+
+    assert draws(first, source) == draws(second, source)
+    assert draws(first, source, 'v') == draws(second, source, 'v')
+    assert draws(QuestionSampler(strategy, seed=8), source) != draws(QuestionSampler(strategy, seed=7), source)
+
+
+def test_least_annotated_prefers_unannotated_questions_and_answers():
+    source = Source('q', 3)
+    sampler = QuestionSampler('least-annotated', seed=1)
+    for question_id in ('q0', 'q1'):
+        sampler.record_annotation({'domain': 'd', 'questionId': question_id, 'answerId': f'{question_id}-a0'})
+    sampler.record_annotation({'domain': 'd', 'questionId': 'q2', 'answerId': 'q2-a0'})
+    sampler.record_annotation({'domain': 'd', 'questionId': 'q0', 'answerId': 'q0-a1'})
+
+    question, answer = sampler.sample('d', 'u', source)
+    assert question['id'] in ('q1', 'q2')
+    assert answer['id'] == f"{question['id']}-a1"
+
+
+def test_least_annotated_follows_annotations_made_after_the_pool_was_built():
+    source = Source('q', 4)
+    sampler = QuestionSampler('least-annotated', seed=1)
+    assert sampler.remaining('d', 'u', source) == 4
+    for question_id in ('q0', 'q1', 'q3', 'q3'):
+        sampler.record_annotation({'domain': 'd', 'questionId': question_id, 'answerId': f'{question_id}-a0'})
+
+    assert [q['id'] for q, _ in sampler.sample_many('d', 'u', source, 4)][:1] == ['q2']
+    assert [q['id'] for q, _ in sampler.sample_many('d', 'u', source, 4)][-1] == 'q3'
+
+
+def test_reviewed_questions_leave_the_pool():
+    source = Source('q', 3)
+    sampler = QuestionSampler(seed=1)
+    for question_id in ('q0', 'q1'):
+        sampler.mark_reviewed('u', question_id, 'd')
+
+    assert sampler.sample('d', 'u', source)[0]['id'] == 'q2'
+    sampler.mark_reviewed('u', 'q2', 'd')
+    assert sampler.sample('d', 'u', source) is None
+    assert sampler.remaining('d', 'v', source) == 3
+
+
+def test_refused_claims_are_reported_separately_from_exhaustion():
+    source = Source('q', 2)
+    sampler = QuestionSampler(seed=1)
+
+    with pytest.raises(QuestionsClaimed) as excinfo:
+        sampler.sample('d', 'u', source, claim=lambda question_id: False)
+    assert sorted(excinfo.value.question_ids) == ['q0', 'q1']
+    # Refused questions stay available once the claim succeeds
+    assert len(sampler.sample_many('d', 'u', source, 5, claim=lambda question_id: True)) == 2
+
+
+def test_cluster_counts_as_one_reviewed_item_across_domains():
+    first, second = Source('a', 3), Source('b', 3)
+    sampler = QuestionSampler(seed=1)
+    sampler.load_clusters([[('First', 'a0'), ('Second', 'b0')]])
+
+    assert sampler.remaining('second', 'u', second) == 3
+    sampler.mark_reviewed('u', 'a0', 'First')
+    assert sampler.remaining('second', 'u', second) == 2
+    assert 'b0' not in [q['id'] for q, _ in sampler.sample_many('second', 'u', second, 5)]
+    assert sampler.remaining('second', 'v', second) == 3
+
+
+def test_reloaded_reviewed_entries_match_clusters_by_domain():
+    second, third = Source('b', 3), Source('a', 3)
+    sampler = QuestionSampler(seed=1)
+    sampler.load_clusters([[('first', 'a0'), ('second', 'b0')]])
+    sampler.load_reviewed({'u': {'first': ['a0']}, 'legacy': ['a0']})
+
+    assert sampler.remaining('second', 'u', second) == 2
+    # Ids saved without a domain are not matched to clusters
+    assert sampler.remaining('second', 'legacy', second) == 3
+    # A question that only shares an id with a cluster member is not a duplicate
+    sampler.load_reviewed({'w': {'other': ['b0']}})
+    assert sampler.remaining('first', 'w', third) == 3
+
+
+def test_indexed_set_discard_keeps_positions_consistent():
+    items = IndexedSet(range(5))
+    items.discard(1)
+    items.discard(4)
+    items.add(6)
+
+    assert sorted(items) == [0, 2, 3, 6]
+    assert all(i in items for i in (0, 2, 3, 6)) and 1 not in items
@@ -0,0 +1,102 @@
+"""Tests for the append-only response log."""
+
+import threading
+
+from response_log import (ResponseLog, compact_log, iter_records, iter_records_from,
+                          list_segments, recover_log, rotate_log)
+
+
+def test_recover_log_truncates_torn_final_line(tmp_path):
+    path = tmp_path / 'responses.jsonl'
+    path.write_bytes(b'{"n":1}\n{"n":2}\n{"n":3,"ratin')
+
+    assert recover_log(str(path)) == len(b'{"n":3,"ratin')
+    assert path.read_bytes() == b'{"n":1}\n{"n":2}\n'
+    assert recover_log(str(path)) == 0
+
+
+def test_recover_log_truncates_single_torn_line(tmp_path):
+    path = tmp_path / 'responses.jsonl'
+    path.write_bytes(b'{"n":1')
+
+    recover_log(str(path))
+    assert path.read_bytes() == b''
+
+
+def test_open_recovers_and_appends_after_torn_line(tmp_path):
+    path = tmp_path / 'responses.jsonl'
+    path.write_bytes(b'{"n":1}\n{"n":')
+
+    log = ResponseLog(str(path), fsync='never')
+    log.append({'n': 2})
+    log.close()
+
+    assert [r['n'] for r in iter_records(str(path))] == [1, 2]
+
+
+def test_cursor_survives_rotation(tmp_path):
+    path = str(tmp_path / 'responses.jsonl')
+    log = ResponseLog(path, fsync='never')
+    log.append_many([{'n': 1}, {'n': 2}, {'n': 3}])
+
+    positions = [position for _, position in iter_records_from(path)]
+    resume = positions[1]
+
+    assert log.rotate() == path + '.1'
+    log.append_many([{'n': 4}, {'n': 5}])
+    log.close()
+
+    assert list_segments(path) == [path + '.1']
+    assert [r['n'] for r, _ in iter_records_from(path, resume)] == [3, 4, 5]
+
+
+def test_cursor_survives_offline_rotation(tmp_path):
+    path = str(tmp_path / 'responses.jsonl')
+    log = ResponseLog(path, fsync='never')
+    log.append_many([{'n': 1}, {'n': 2}])
+    log.close()
+
+    resume = list(iter_records_from(path))[-1][1]
+    rotate_log(path)
+    rotate_log(path)
+
+    log = ResponseLog(path, fsync='never')
+    log.append({'n': 3})
+    log.close()
+    assert [r['n'] for r, _ in iter_records_from(path, resume)] == [3]
+
+
+def test_compact_merges_segments_and_skips_corrupt_lines(tmp_path):
+    path = tmp_path / 'responses.jsonl'
+    path.write_bytes(b'{"n":1}\nnot json\n')
+    rotate_log(str(path))
+    path.write_bytes(b'{"n":2}\n')
+
+    assert compact_log(str(path)) == 2
+    assert list_segments(str(path)) == []
+    assert [r['n'] for r in iter_records(str(path))] == [1, 2]
+
+
+def test_batch_appends_are_synced_before_returning(tmp_path):
+    log = ResponseLog(str(tmp_path / 'responses.jsonl'), fsync='batch')
+    unsynced = []
+
+    def writer(i):
+        for j in range(20):
+            with log._lock:
+                before = log._written
+            log.append({'writer': i, 'n': j})
+            # This record is number before + 1 or later; an fsync must have covered it
+            with log._lock:
+                if log._synced < before + 1:
+                    unsynced.append((i, j))
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert unsynced == []
+    assert log._synced == log._written == 160
+    log.close()
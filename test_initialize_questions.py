@@ -0,0 +1,44 @@
+"""Tests for the corpus importer."""
+
+import json
+
+import pytest
+
+import initialize_questions
+from initialize_questions import import_corpora, iter_corpus
+
+RECORDS = [
+    {'qid': 12345, 'question': 'Split "quoted" text', 'answer1': 'café', 'labels': '1: A'},
+    {'id': 'x-1', 'text': 'Nested', 'answers': [{'id': 'x-1-a1', 'text': 'a', 'score': -0.125}]},
+    {'qid': 7, 'question': '', 'answer1': 'b', 'answer2': 'c'},
+]
+
+
+@pytest.mark.parametrize('read_size', [1, 2, 3, 5, 7, 11, 64])
+@pytest.mark.parametrize('wrapped', [False, True])
+def test_values_split_across_read_boundaries(tmp_path, monkeypatch, read_size, wrapped):
+    monkeypatch.setattr(initialize_questions, 'READ_SIZE', read_size)
+    path = tmp_path / 'corpus.json'
+    data = {'meta': {'n': 3}, 'questions': RECORDS} if wrapped else RECORDS
+    path.write_text(json.dumps(data, ensure_ascii=False, indent=1), encoding='utf-8')
+
+    assert list(iter_corpus(str(path))) == RECORDS
+
+
+def test_number_ending_the_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(initialize_questions, 'READ_SIZE', 4)
+    path = tmp_path / 'corpus.json'
+    path.write_text('[12345678]')
+
+    assert list(iter_corpus(str(path))) == [12345678]
+
+
+def test_import_dedupes_on_normalized_ids_across_corpora(tmp_path):
+    first, second = tmp_path / 'first.json', tmp_path / 'second.json'
+    first.write_text(json.dumps([{'qid': 1, 'question': 'q'}, {'id': '1', 'text': 't', 'answers': []},
+                                 {'question': 'no id'}]))
+    second.write_text(json.dumps([{'qid': 1, 'question': 'again'}, {'id': 'kd_2', 'text': 't', 'answers': []}]))
+
+    assert import_corpora('Test', [str(first), str(second)], out_dir=str(tmp_path)) == 3
+    questions = json.loads((tmp_path / 'test-questions.json').read_text())['questions']
+    assert [q['id'] for q in questions] == ['kd_1', '1', 'kd_2']